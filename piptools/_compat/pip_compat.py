@@ -1,6 +1,4 @@
 import pip
-from pip._internal.req import parse_requirements as _parse_requirements
-from pip._internal.req.constructors import install_req_from_parsed_requirement
 from pip._vendor.packaging.version import parse as parse_version
 
 PIP_VERSION = tuple(map(int, parse_version(pip.__version__).base_version.split(".")))
@@ -9,6 +7,9 @@ PIP_VERSION = tuple(map(int, parse_version(pip.__version__).base_version.split("
 def parse_requirements(
     filename, session, finder=None, options=None, constraint=False, isolated=False
 ):
+    from pip._internal.req import parse_requirements as _parse_requirements
+    from pip._internal.req.constructors import install_req_from_parsed_requirement
+
     for parsed_req in _parse_requirements(
         filename, session, finder=finder, options=options, constraint=constraint
     ):
@@ -1,12 +1,28 @@
+import atexit
+import collections
+import hashlib
 import json
+import mmap
 import os
 import platform
+import sqlite3
+import struct
 import sys
-
-from pip._vendor.packaging.requirements import Requirement
+import time
+from abc import ABCMeta, abstractmethod
+from array import array
+from shutil import rmtree
 
 from .exceptions import PipToolsError
-from .utils import as_tuple, key_from_req, lookup_table
+from .utils import as_tuple, key_from_req
+
+_BINARY_HEADER = struct.Struct("<4sIIII")
+_BINARY_MAGIC = b"PTDC"
+_UINT = struct.Struct("<I")
+
+# The last use of cache entries is only recorded once per day, so looking up
+# entries doesn't rewrite the cache at each run
+LAST_USED_RESOLUTION = 24 * 60 * 60
 
 _PEP425_PY_TAGS = {"cpython": "cp", "pypy": "pp", "ironpython": "ip", "jython": "jy"}
 
@@ -35,6 +51,10 @@ class CorruptCacheError(PipToolsError):
 
 
 def read_cache_file(cache_file_path):
+    return _read_cache_document(cache_file_path)["dependencies"]
+
+
+def _read_cache_document(cache_file_path):
     with open(cache_file_path) as cache_file:
         try:
             doc = json.load(cache_file)
@@ -44,37 +64,81 @@ def read_cache_file(cache_file_path):
         # Check version and load the contents
         if doc["__format__"] != 1:
             raise ValueError("Unknown cache file format")
-        return doc["dependencies"]
+        return doc
 
 
-class DependencyCache:
+def _read_last_used(doc, default):
     """
-    Creates a new persistent dependency cache for the current Python version.
-    The cache file is written to the appropriate user cache dir for the
-    current platform, i.e.
+    Returns the last used times of a cache document, where the entries of
+    files written before they were recorded count as used at default. The
+    default is filled in, so the next write persists it.
+    """
+    last_used = doc.get("last_used", {})
+    for pkgname, versions in doc["dependencies"].items():
+        package_last_used = last_used.setdefault(pkgname, {})
+        for pkgversion_and_extras in versions:
+            package_last_used.setdefault(pkgversion_and_extras, default)
+    return last_used
 
-        ~/.cache/pip-tools/depcache-pyX.Y.json
 
-    Where py indicates the Python implementation.
-    Where X.Y indicates the Python version.
+def _select_stale_entries(entries, max_entries, max_age):
     """
+    Given (last used, key) pairs, returns the keys of the least recently used
+    entries beyond max_entries and of the entries unused for max_age seconds.
+    """
+    entries = sorted(entries)
+    stale_count = 0
+    if max_entries is not None:
+        stale_count = max(len(entries) - max_entries, 0)
+    if max_age is not None:
+        oldest_allowed = time.time() - max_age
+        stale_count = max(
+            stale_count,
+            sum(1 for last_used, _ in entries if last_used < oldest_allowed),
+        )
+    return [key for _, key in entries[:stale_count]]
 
-    def __init__(self, cache_dir):
-        os.makedirs(cache_dir, exist_ok=True)
-        cache_filename = f"depcache-{_implementation_name()}.json"
 
-        self._cache_file = os.path.join(cache_dir, cache_filename)
-        self._cache = None
+DependencyEdge = collections.namedtuple(
+    "DependencyEdge", "key specifier markers extras"
+)
 
-    @property
-    def cache(self):
-        """
-        The dictionary that is the actual in-memory cache.  This property
-        lazily loads the cache from disk.
-        """
-        if self._cache is None:
-            self.read_cache()
-        return self._cache
+
+def parse_dependency_edge(dependency):
+    """
+    Parses a cached dependency string, like ``"Django>=2.2; extra == 'db'"``,
+    into a DependencyEdge with the normalized key of the dependency.
+    """
+    from pip._vendor.packaging.requirements import Requirement
+
+    req = Requirement(dependency)
+    return DependencyEdge(
+        key=key_from_req(req),
+        specifier=str(req.specifier),
+        markers=str(req.marker) if req.marker else None,
+        extras=frozenset(req.extras),
+    )
+
+
+class BaseDependencyCache(metaclass=ABCMeta):
+    """
+    A persistent cache of the dependencies of pinned requirements, keyed by
+    name and version (and extras) of the requirement. Implementations only
+    have to store and look up cache keys, see ``as_cache_key()``.
+
+    The dependencies of the entries are parsed into DependencyEdges once, as
+    they are added or first used, and indexed by the key of each dependency
+    for ``reverse_dependencies()``. The same dependency strings occur over
+    and over in the cache, so each of them is only parsed once per cache.
+    """
+
+    def __init__(self):
+        # stores cache key => (dependencies, DependencyEdges) mappings
+        self._edges = {}
+        # stores dependency key => set of cache keys of its dependents
+        self._reverse_index = collections.defaultdict(set)
+        # stores dependency string => DependencyEdge mappings
+        self._parsed_edges = {}
 
     def as_cache_key(self, ireq):
         """
@@ -96,36 +160,86 @@ class DependencyCache:
             extras_string = f"[{','.join(extras)}]"
         return name, f"{version}{extras_string}"
 
-    def read_cache(self):
-        """Reads the cached contents into memory."""
-        try:
-            self._cache = read_cache_file(self._cache_file)
-        except FileNotFoundError:
-            self._cache = {}
+    @abstractmethod
+    def _get(self, cache_key):
+        """
+        Should return the dependencies cached for the cache key, or None.
+        """
 
-    def write_cache(self):
-        """Writes the cache to disk as JSON."""
-        doc = {"__format__": 1, "dependencies": self._cache}
-        with open(self._cache_file, "w") as f:
-            json.dump(doc, f, sort_keys=True)
+    @abstractmethod
+    def _set(self, cache_key, values):
+        """
+        Should cache the dependencies for the cache key.
+        """
 
+    @abstractmethod
     def clear(self):
-        self._cache = {}
-        self.write_cache()
+        """
+        Should remove all the cached dependencies.
+        """
+
+    def flush(self):
+        """
+        Should make sure the cached dependencies are stored persistently.
+        """
+
+    @abstractmethod
+    def prune(self, max_entries=None, max_age=None):
+        """
+        Should remove the least recently used entries beyond max_entries, and
+        the entries unused for more than max_age seconds, and compact the
+        storage. Returns the number of removed entries.
+        """
 
     def __contains__(self, ireq):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        return pkgversion_and_extras in self.cache.get(pkgname, {})
+        return self._get(self.as_cache_key(ireq)) is not None
 
     def __getitem__(self, ireq):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        return self.cache[pkgname][pkgversion_and_extras]
+        return self._getitem(self.as_cache_key(ireq))
+
+    def _getitem(self, cache_key):
+        values = self._get(cache_key)
+        if values is None:
+            raise KeyError(cache_key)
+        return values
 
     def __setitem__(self, ireq, values):
-        pkgname, pkgversion_and_extras = self.as_cache_key(ireq)
-        self.cache.setdefault(pkgname, {})
-        self.cache[pkgname][pkgversion_and_extras] = values
-        self.write_cache()
+        cache_key = self.as_cache_key(ireq)
+        self._set(cache_key, values)
+        self._index_edges(cache_key, values)
+
+    def dependency_edges(self, ireq):
+        """
+        Returns the cached dependencies of the requirement as DependencyEdges.
+        """
+        return self._dependency_edges(self.as_cache_key(ireq))
+
+    def _dependency_edges(self, cache_key):
+        values = tuple(self._getitem(cache_key))
+        indexed = self._edges.get(cache_key)
+        if indexed is None or indexed[0] != values:
+            # Not indexed yet, or changed on disk since
+            self._index_edges(cache_key, values)
+        return list(self._edges[cache_key][1])
+
+    def _index_edges(self, cache_key, values):
+        """
+        Parses the dependencies of the cache key, and adds them to the reverse
+        index in place of the previous ones.
+        """
+        previous = self._edges.get(cache_key)
+        if previous is not None:
+            for edge in previous[1]:
+                self._reverse_index[edge.key].discard(cache_key)
+
+        edges = []
+        for value in values:
+            edge = self._parsed_edges.get(value)
+            if edge is None:
+                edge = self._parsed_edges[value] = parse_dependency_edge(value)
+            edges.append(edge)
+            self._reverse_index[edge.key].add(cache_key)
+        self._edges[cache_key] = (tuple(values), tuple(edges))
 
     def reverse_dependencies(self, ireqs):
         """
@@ -158,10 +272,788 @@ class DependencyCache:
              'pyflakes': ['flake8']}
 
         """
-        # First, collect all the dependencies into a sequence of (parent, child)
-        # tuples, like [('flake8', 'pep8'), ('flake8', 'mccabe'), ...]
-        return lookup_table(
-            (key_from_req(Requirement(dep_name)), name)
-            for name, version_and_extras in cache_keys
-            for dep_name in self.cache[name][version_and_extras]
+        cache_keys = set(cache_keys)
+        dependency_keys = {
+            edge.key
+            for cache_key in cache_keys
+            for edge in self._dependency_edges(cache_key)
+        }
+        return {
+            dependency_key: {
+                cache_key[0]
+                for cache_key in self._reverse_index[dependency_key] & cache_keys
+            }
+            for dependency_key in dependency_keys
+        }
+
+
+class DependencyCache(BaseDependencyCache):
+    """
+    Creates a new persistent dependency cache for the current Python version.
+    The cache file is written to the appropriate user cache dir for the
+    current platform, i.e.
+
+        ~/.cache/pip-tools/depcache-pyX.Y.json
+
+    Where py indicates the Python implementation.
+    Where X.Y indicates the Python version.
+
+    New entries are kept in memory and written to disk in batches: once
+    ``flush_threshold`` unsaved entries have accumulated, once
+    ``flush_interval`` seconds have passed since the last write, on an explicit
+    ``flush()``, or at interpreter exit.
+
+    The time each entry was last used is stored along with the dependencies,
+    entries of files written without it count as used when the file was
+    last modified.
+    """
+
+    def __init__(self, cache_dir, flush_threshold=100, flush_interval=30.0):
+        super().__init__()
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_filename = f"depcache-{_implementation_name()}.json"
+
+        self._cache_file = os.path.join(cache_dir, cache_filename)
+        self._cache = None
+        self._last_used = None
+        self._default_last_used = None
+
+        self.flush_threshold = flush_threshold
+        self.flush_interval = flush_interval
+        self._unsaved_entries = 0
+        self._last_write = time.monotonic()
+
+    @property
+    def cache(self):
+        """
+        The dictionary that is the actual in-memory cache.  This property
+        lazily loads the cache from disk.
+        """
+        if self._cache is None:
+            self.read_cache()
+        return self._cache
+
+    def read_cache(self):
+        """Reads the cached contents into memory."""
+        try:
+            doc = _read_cache_document(self._cache_file)
+        except FileNotFoundError:
+            doc = {"dependencies": {}}
+            self._default_last_used = int(time.time())
+        else:
+            self._default_last_used = int(os.path.getmtime(self._cache_file))
+        self._cache = doc["dependencies"]
+        self._last_used = _read_last_used(doc, self._default_last_used)
+
+    def write_cache(self):
+        """
+        Writes the cache to disk as JSON.
+
+        The file is written to a temporary file next to the cache file first
+        and then renamed over it, so an interrupted write never leaves a
+        truncated cache file behind.
+        """
+        self._write_cache_file()
+
+        self._last_write = time.monotonic()
+        if self._unsaved_entries:
+            self._unsaved_entries = 0
+            atexit.unregister(self._flush_at_exit)
+
+    def _write_cache_file(self):
+        from pip._internal.utils.filesystem import adjacent_tmp_file, replace
+
+        doc = {
+            "__format__": 1,
+            "dependencies": self._cache,
+            "last_used": self._last_used,
+        }
+        with adjacent_tmp_file(self._cache_file, mode="w") as f:
+            json.dump(doc, f, sort_keys=True)
+        replace(f.name, self._cache_file)
+
+    def flush(self):
+        """Writes the cache to disk if it has unsaved entries."""
+        if self._unsaved_entries:
+            self.write_cache()
+
+    def _flush_at_exit(self):
+        # The cache dir may have been removed in the meantime (e.g. a temporary
+        # one), in which case there is nothing worth saving.
+        if os.path.isdir(os.path.dirname(self._cache_file)):
+            self.flush()
+
+    def clear(self):
+        self._cache = {}
+        self._last_used = {}
+        self.write_cache()
+
+    def prune(self, max_entries=None, max_age=None):
+        cache_keys = [
+            (pkgname, pkgversion_and_extras)
+            for pkgname, versions in self.cache.items()
+            for pkgversion_and_extras in versions
+        ]
+        stale_entries = _select_stale_entries(
+            ((self._get_last_used(cache_key), cache_key) for cache_key in cache_keys),
+            max_entries,
+            max_age,
+        )
+        for pkgname, pkgversion_and_extras in stale_entries:
+            for mapping in (self._cache, self._last_used):
+                versions = mapping.get(pkgname, {})
+                versions.pop(pkgversion_and_extras, None)
+                if not versions:
+                    mapping.pop(pkgname, None)
+
+        if stale_entries:
+            self.write_cache()
+        return len(stale_entries)
+
+    def _get_last_used(self, cache_key):
+        pkgname, pkgversion_and_extras = cache_key
+        return self._last_used.get(pkgname, {}).get(
+            pkgversion_and_extras, self._default_last_used
+        )
+
+    def _touch(self, cache_key):
+        pkgname, pkgversion_and_extras = cache_key
+        now = int(time.time())
+        if now - self._get_last_used(cache_key) >= LAST_USED_RESOLUTION:
+            self._last_used.setdefault(pkgname, {})[pkgversion_and_extras] = now
+            self._add_unsaved_entry()
+
+    def _get(self, cache_key):
+        pkgname, pkgversion_and_extras = cache_key
+        values = self.cache.get(pkgname, {}).get(pkgversion_and_extras)
+        if values is not None:
+            self._touch(cache_key)
+        return values
+
+    def _set(self, cache_key, values):
+        pkgname, pkgversion_and_extras = cache_key
+        self.cache.setdefault(pkgname, {})
+        self.cache[pkgname][pkgversion_and_extras] = values
+        self._last_used.setdefault(pkgname, {})[pkgversion_and_extras] = int(
+            time.time()
+        )
+        self._add_unsaved_entry()
+
+    def _add_unsaved_entry(self):
+        if not self._unsaved_entries:
+            # Make sure the entries end up on disk even if nobody flushes them
+            atexit.register(self._flush_at_exit)
+        self._unsaved_entries += 1
+
+        if (
+            self._unsaved_entries >= self.flush_threshold
+            or time.monotonic() - self._last_write >= self.flush_interval
+        ):
+            self.write_cache()
+
+
+class BinaryCacheFile:
+    """
+    Reads a dependency cache file in the compact binary format written by
+    ``write_binary_cache_file()``. The file is memory-mapped and nothing is
+    decoded upfront: looking up a package is a binary search over the sorted
+    package names, and only the versions of that package are decoded.
+
+    The file consists of a header, followed by arrays of little-endian
+    unsigned 32-bit integers and a blob of UTF-8 strings:
+
+    - the end offset of each string in the blob, strings are referred to by
+      their index in this array, so each distinct string is stored only once
+    - a (name, position in the entries array) pair for each package, sorted
+      by name
+    - the entries of each package: the number of versions, then for each
+      version the version (and extras), the time it was last used, the
+      number of dependencies and the dependencies
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                raise CorruptCacheError(path)
+
+        try:
+            magic, version, strings, packages, words = _BINARY_HEADER.unpack_from(
+                self._mmap
+            )
+        except struct.error:
+            self.close()
+            raise CorruptCacheError(path)
+        if magic != _BINARY_MAGIC:
+            self.close()
+            raise CorruptCacheError(path)
+        if version != 1:
+            self.close()
+            raise ValueError("Unknown cache file format")
+
+        self._package_count = packages
+        self._strings_offset = _BINARY_HEADER.size
+        self._packages_offset = self._strings_offset + 4 * strings
+        self._words_offset = self._packages_offset + 8 * packages
+        self._blob_offset = self._words_offset + 4 * words
+
+    def close(self):
+        self._mmap.close()
+
+    def _uint(self, offset):
+        return _UINT.unpack_from(self._mmap, offset)[0]
+
+    def _string(self, string_id):
+        offset = self._strings_offset + 4 * string_id
+        start = self._uint(offset - 4) if string_id else 0
+        end = self._uint(offset)
+        return self._mmap[self._blob_offset + start : self._blob_offset + end].decode()
+
+    def _package(self, index):
+        name_id, position = struct.unpack_from(
+            "<II", self._mmap, self._packages_offset + 8 * index
+        )
+        return self._string(name_id), position
+
+    def names(self):
+        """Yields the names of all the packages in the file."""
+        for index in range(self._package_count):
+            yield self._package(index)[0]
+
+    def get_package(self, name):
+        """
+        Returns the dependencies of all the cached versions of the package and
+        the times they were last used, like ``({"1.0": ["six"]}, {"1.0": 0})``,
+        or None if the package is not in the file.
+        """
+        try:
+            low, high = 0, self._package_count
+            while low < high:
+                middle = (low + high) // 2
+                middle_name, position = self._package(middle)
+                if middle_name == name:
+                    return self._decode_package(position)
+                if middle_name < name:
+                    low = middle + 1
+                else:
+                    high = middle
+            return None
+        except (struct.error, ValueError):
+            raise CorruptCacheError(self.path)
+
+    def _decode_package(self, position):
+        offset = self._words_offset + 4 * position
+        version_count = self._uint(offset)
+        offset += 4
+
+        versions = {}
+        last_used = {}
+        for _ in range(version_count):
+            version_id, version_last_used, count = struct.unpack_from(
+                "<III", self._mmap, offset
+            )
+            offset += 12
+            value_ids = struct.unpack_from(f"<{count}I", self._mmap, offset)
+            offset += 4 * count
+
+            version_and_extras = self._string(version_id)
+            versions[version_and_extras] = [
+                self._string(value_id) for value_id in value_ids
+            ]
+            last_used[version_and_extras] = version_last_used
+        return versions, last_used
+
+
+def write_binary_cache_file(cache_file_path, dependencies, last_used=None):
+    """
+    Writes the dependencies, a ``{name: {version_and_extras: [dependency]}}``
+    dict, to the file in the format read by ``BinaryCacheFile``, along with
+    the times they were last used, in a dict of the same shape.
+    """
+    from pip._internal.utils.filesystem import adjacent_tmp_file, replace
+
+    if last_used is None:
+        last_used = {}
+    string_ids = {}
+
+    def intern(string):
+        return string_ids.setdefault(string, len(string_ids))
+
+    packages = array("I")
+    words = array("I")
+    for name in sorted(dependencies):
+        packages.extend((intern(name), len(words)))
+        versions = dependencies[name]
+        words.append(len(versions))
+        for version_and_extras in sorted(versions):
+            values = versions[version_and_extras]
+            version_last_used = last_used.get(name, {}).get(version_and_extras, 0)
+            words.extend((intern(version_and_extras), version_last_used, len(values)))
+            words.extend(intern(value) for value in values)
+
+    # Strings are numbered in insertion order
+    blob = b"".join(string.encode() for string in string_ids)
+    string_ends = array("I")
+    end = 0
+    for string in string_ids:
+        end += len(string.encode())
+        string_ends.append(end)
+
+    if sys.byteorder == "big":
+        for integers in (string_ends, packages, words):
+            integers.byteswap()
+
+    header = _BINARY_HEADER.pack(
+        _BINARY_MAGIC, 1, len(string_ends), len(packages) // 2, len(words)
+    )
+    with adjacent_tmp_file(cache_file_path, mode="wb") as f:
+        f.write(header)
+        for integers in (string_ends, packages, words):
+            f.write(integers.tobytes())
+        f.write(blob)
+    replace(f.name, cache_file_path)
+
+
+class BinaryDependencyCache(DependencyCache):
+    """
+    A ``DependencyCache`` stored in the compact binary format of
+    ``BinaryCacheFile``, i.e.
+
+        ~/.cache/pip-tools/depcache-pyX.Y.bin
+
+    Opening the cache is cheap whatever its size, since packages are only
+    decoded when they are looked up. The entries of an existing JSON cache
+    file are imported when the binary file doesn't exist yet.
+    """
+
+    def __init__(self, cache_dir, flush_threshold=100, flush_interval=30.0):
+        super().__init__(
+            cache_dir, flush_threshold=flush_threshold, flush_interval=flush_interval
+        )
+        self._json_cache_file = self._cache_file
+        self._cache_file = os.path.join(
+            cache_dir, f"depcache-{_implementation_name()}.bin"
         )
+        self._file = None
+
+    def read_cache(self):
+        """
+        Opens the cache file, the packages are read into memory on demand.
+        """
+        self._close_file()
+        self._cache = {}
+        self._last_used = {}
+        self._default_last_used = int(time.time())
+        try:
+            self._file = BinaryCacheFile(self._cache_file)
+        except FileNotFoundError:
+            try:
+                doc = _read_cache_document(self._json_cache_file)
+            except FileNotFoundError:
+                return
+            self._default_last_used = int(os.path.getmtime(self._json_cache_file))
+            self._cache = doc["dependencies"]
+            self._last_used = _read_last_used(doc, self._default_last_used)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _load_package(self, name):
+        if name not in self.cache and self._file is not None:
+            package = self._file.get_package(name)
+            if package is not None:
+                self._cache[name], self._last_used[name] = package
+
+    def _write_cache_file(self):
+        dependencies = dict(self._cache)
+        last_used = {
+            name: {
+                version_and_extras: self._get_last_used((name, version_and_extras))
+                for version_and_extras in versions
+            }
+            for name, versions in self._cache.items()
+        }
+        if self._file is not None:
+            for name in self._file.names():
+                if name not in dependencies:
+                    dependencies[name], last_used[name] = self._file.get_package(name)
+            self._close_file()
+
+        write_binary_cache_file(self._cache_file, dependencies, last_used)
+        self._file = BinaryCacheFile(self._cache_file)
+        self._cache = {}
+        self._last_used = {}
+
+    def clear(self):
+        self._close_file()
+        super().clear()
+
+    def prune(self, max_entries=None, max_age=None):
+        # Pruning needs to know all the entries
+        if self._cache is None:
+            self.read_cache()
+        if self._file is not None:
+            for name in list(self._file.names()):
+                self._load_package(name)
+            # Everything is in memory now, the file must not be merged back
+            self._close_file()
+        return super().prune(max_entries=max_entries, max_age=max_age)
+
+    def _get(self, cache_key):
+        self._load_package(cache_key[0])
+        return super()._get(cache_key)
+
+    def _set(self, cache_key, values):
+        self._load_package(cache_key[0])
+        super()._set(cache_key, values)
+
+
+class SQLiteDependencyCache(BaseDependencyCache):
+    """
+    Creates a new persistent dependency cache for the current Python version,
+    stored in an SQLite database in the appropriate user cache dir for the
+    current platform, i.e.
+
+        ~/.cache/pip-tools/depcache-pyX.Y.sqlite3
+
+    Unlike the JSON file of ``DependencyCache``, the database is never loaded
+    as a whole: each lookup is a query on the primary key. The database is in
+    WAL mode and every entry is committed on its own, so several processes
+    may read and write the cache at the same time. The time each entry was
+    last used is indexed, for ``prune()``.
+
+    The entries of an existing ``DependencyCache`` file are imported when the
+    database is created.
+    """
+
+    def __init__(self, cache_dir, timeout=30.0):
+        super().__init__()
+        os.makedirs(cache_dir, exist_ok=True)
+        implementation_name = _implementation_name()
+
+        self._db_file = os.path.join(
+            cache_dir, f"depcache-{implementation_name}.sqlite3"
+        )
+        self._json_cache_file = os.path.join(
+            cache_dir, f"depcache-{implementation_name}.json"
+        )
+        self.timeout = timeout
+        self._connection = None
+
+    @property
+    def connection(self):
+        """
+        The connection to the database. This property lazily creates the
+        database, and imports the JSON cache file into it.
+        """
+        if self._connection is None:
+            # Autocommit mode, transactions are started explicitly
+            connection = sqlite3.connect(
+                self._db_file, timeout=self.timeout, isolation_level=None
+            )
+            try:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+                self._migrate(connection)
+            except sqlite3.DatabaseError:
+                connection.close()
+                raise CorruptCacheError(self._db_file)
+            self._connection = connection
+        return self._connection
+
+    def _migrate(self, connection):
+        # The schema version is checked again once the database is locked,
+        # in case another process is migrating it concurrently
+        if connection.execute("PRAGMA user_version").fetchone()[0] == 2:
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version == 0:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS dependencies ("
+                    " name TEXT NOT NULL,"
+                    " version_and_extras TEXT NOT NULL,"
+                    " dependencies TEXT NOT NULL,"
+                    " last_used INTEGER NOT NULL,"
+                    " PRIMARY KEY (name, version_and_extras)"
+                    ") WITHOUT ROWID"
+                )
+                connection.executemany(
+                    "INSERT OR IGNORE INTO dependencies"
+                    " (name, version_and_extras, dependencies, last_used)"
+                    " VALUES (?, ?, ?, ?)",
+                    self._read_json_cache_file(),
+                )
+            elif version == 1:
+                connection.execute(
+                    "ALTER TABLE dependencies ADD COLUMN"
+                    f" last_used INTEGER NOT NULL DEFAULT {int(time.time())}"
+                )
+            if version < 2:
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS dependencies_last_used"
+                    " ON dependencies (last_used)"
+                )
+                connection.execute("PRAGMA user_version = 2")
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _read_json_cache_file(self):
+        try:
+            doc = _read_cache_document(self._json_cache_file)
+            default_last_used = int(os.path.getmtime(self._json_cache_file))
+        except (OSError, ValueError, KeyError, CorruptCacheError):
+            # Nothing worth importing, it is only a cache
+            return
+        last_used = doc.get("last_used", {})
+        for name, versions_and_extras in doc["dependencies"].items():
+            for version_and_extras, values in versions_and_extras.items():
+                yield (
+                    name,
+                    version_and_extras,
+                    json.dumps(values),
+                    last_used.get(name, {}).get(version_and_extras, default_last_used),
+                )
+
+    def _get(self, cache_key):
+        row = self.connection.execute(
+            "SELECT dependencies, last_used FROM dependencies"
+            " WHERE name = ? AND version_and_extras = ?",
+            cache_key,
+        ).fetchone()
+        if row is None:
+            return None
+
+        values, last_used = row
+        now = int(time.time())
+        if now - last_used >= LAST_USED_RESOLUTION:
+            self.connection.execute(
+                "UPDATE dependencies SET last_used = ?"
+                " WHERE name = ? AND version_and_extras = ?",
+                (now, *cache_key),
+            )
+        return json.loads(values)
+
+    def _set(self, cache_key, values):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO dependencies"
+            " (name, version_and_extras, dependencies, last_used)"
+            " VALUES (?, ?, ?, ?)",
+            (*cache_key, json.dumps(values), int(time.time())),
+        )
+
+    def clear(self):
+        self.connection.execute("DELETE FROM dependencies")
+
+    def prune(self, max_entries=None, max_age=None):
+        removed = 0
+        if max_age is not None:
+            removed += self.connection.execute(
+                "DELETE FROM dependencies WHERE last_used < ?",
+                (time.time() - max_age,),
+            ).rowcount
+        if max_entries is not None:
+            stale_entries = self.connection.execute(
+                "SELECT name, version_and_extras FROM dependencies"
+                " ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                (max_entries,),
+            ).fetchall()
+            self.connection.executemany(
+                "DELETE FROM dependencies WHERE name = ? AND version_and_extras = ?",
+                stale_entries,
+            )
+            removed += len(stale_entries)
+
+        if removed:
+            self.connection.execute("VACUUM")
+        return removed
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class FileCache:
+    """
+    A persistent cache of JSON documents, stored in one file per key below a
+    subdirectory of the cache dir, i.e.
+
+        ~/.cache/pip-tools/<name>/ab/cd/ef/0123456789...json
+
+    Missing, unreadable and corrupt entries are all treated as cache misses.
+    If ``max_size`` is given, the least recently used entries are removed on
+    the first write of the process until the entries fit in ``max_size``
+    bytes.
+    """
+
+    def __init__(self, cache_dir, name, max_size=None):
+        self._directory = os.path.join(cache_dir, name)
+        self.max_size = max_size
+        self._pruned = False
+
+    def _path(self, key):
+        digest = hashlib.sha224(key.encode()).hexdigest()
+        # Nest directories to avoid running out of top level dirs on some FS
+        parts = [digest[:2], digest[2:4], digest[4:6], f"{digest[6:]}.json"]
+        return os.path.join(self._directory, *parts)
+
+    def get(self, key):
+        """Returns the value cached for the key, or None."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                doc = json.load(f)
+            # Mark the entry as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(doc, dict) or doc.get("key") != key:
+            return None
+        return doc.get("value")
+
+    def set(self, key, value):
+        """Caches the JSON serializable value for the key."""
+        from pip._internal.utils.filesystem import adjacent_tmp_file, replace
+
+        if not self._pruned:
+            self._pruned = True
+            self.prune()
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with adjacent_tmp_file(path, mode="w") as f:
+            json.dump({"key": key, "value": value}, f, sort_keys=True)
+        replace(f.name, path)
+
+    def prune(self):
+        """Removes the least recently used entries beyond ``max_size``."""
+        if self.max_size is None:
+            return
+
+        entries = []
+        for dirpath, _, filenames in os.walk(self._directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+
+    def clear(self):
+        rmtree(self._directory, ignore_errors=True)
+
+
+class RemoteCache:
+    """
+    A cache of JSON documents shared over plain HTTP: each entry is stored at
+    a content-addressed URL below ``base_url``, i.e.
+
+        <base_url>/<name>/0123456789...
+
+    read with a GET and written with a PUT, so any file server accepting PUT
+    requests (or an object store) can back it. The cache is best effort: all
+    errors are treated as cache misses, and once the server can't be reached
+    the cache is not used anymore for the rest of the process.
+    """
+
+    def __init__(self, base_url, name, session):
+        self._base_url = f"{base_url.rstrip('/')}/{name}"
+        self._session = session
+        self._available = True
+
+    def _url(self, key):
+        return f"{self._base_url}/{hashlib.sha224(key.encode()).hexdigest()}"
+
+    def get(self, key):
+        """Returns the value cached for the key, or None."""
+        from pip._vendor.requests import RequestException
+
+        if not self._available:
+            return None
+        try:
+            response = self._session.get(self._url(key))
+        except RequestException:
+            self._available = False
+            return None
+        if response.status_code != 200:
+            return None
+        try:
+            doc = response.json()
+        except ValueError:
+            return None
+        if not isinstance(doc, dict) or doc.get("key") != key:
+            return None
+        return doc.get("value")
+
+    def set(self, key, value):
+        """Caches the JSON serializable value for the key."""
+        from pip._vendor.requests import RequestException
+
+        if not self._available:
+            return
+        try:
+            self._session.put(self._url(key), json={"key": key, "value": value})
+        except RequestException:
+            self._available = False
+
+
+class RemoteDependencyCache(BaseDependencyCache):
+    """
+    Shares the entries of a local dependency cache with other machines
+    through a ``RemoteCache``: entries missing from the local cache are
+    looked up in the remote one and copied locally, new entries are written
+    to both. Only the local cache is ever cleared.
+
+    Only the dependencies are shared, they are keyed by package name and
+    version. Index pages and hashes are not, as whoever controls the server
+    could otherwise alter the resolution and the hashes written to the output
+    file, and their keys hold the URLs of private indexes.
+    """
+
+    def __init__(self, local, base_url, session):
+        super().__init__()
+        self.local = local
+        self.remote = RemoteCache(
+            base_url, f"depcache-{_implementation_name()}", session
+        )
+
+    def _get(self, cache_key):
+        values = self.local._get(cache_key)
+        if values is None:
+            values = self.remote.get(" ".join(cache_key))
+            if values is not None:
+                self.local._set(cache_key, values)
+        return values
+
+    def _set(self, cache_key, values):
+        self.local._set(cache_key, values)
+        self.remote.set(" ".join(cache_key), values)
+
+    def clear(self):
+        self.local.clear()
+
+    def flush(self):
+        self.local.flush()
+
+    def prune(self, max_entries=None, max_age=None):
+        return self.local.prune(max_entries=max_entries, max_age=max_age)
@@ -0,0 +1,211 @@
+"""
+A daemon running pip-compile with warm repositories and caches, and the thin
+pip-compile-client submitting compile requests to it over a Unix socket.
+
+The client only imports the standard library, so it starts in a fraction of
+the time of pip-compile itself.
+"""
+import io
+import json
+import logging
+import os
+import socket
+import sys
+import traceback
+
+CLIENT_USAGE = """\
+Usage: pip-compile-client SOCKET [PIP_COMPILE_ARGS]...
+
+  Run pip-compile in the daemon started with `pip-compile --serve SOCKET`, or
+  in this process if no daemon listens on SOCKET.
+"""
+
+
+def _send(sock, message):
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def _receive(sock):
+    """Yields the messages received on the socket."""
+    with sock.makefile("rb") as reader:
+        for line in reader:
+            yield json.loads(line)
+
+
+def _pip_environ():
+    return {name: value for name, value in os.environ.items() if name[:4] == "PIP_"}
+
+
+class _SocketWriter(io.RawIOBase):
+    """Forwards the data written to the given stream of the client."""
+
+    def __init__(self, sock, stream):
+        super().__init__()
+        self._sock = sock
+        self._stream = stream
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        text = bytes(data).decode("utf-8", "replace")
+        _send(self._sock, {"stream": self._stream, "data": text})
+        return len(data)
+
+
+def _socket_stream(sock, stream):
+    return io.TextIOWrapper(
+        _SocketWriter(sock, stream), encoding="utf-8", write_through=True
+    )
+
+
+def _reads_stdin(args):
+    """Returns whether pip-compile reads an input file from stdin."""
+    return any(
+        arg == "-" and previous not in ("-o", "--output-file")
+        for previous, arg in zip([None, *args], args)
+    )
+
+
+def _redirect_log_handlers(streams):
+    """
+    Points the stream handlers of the root logger, like the console handlers
+    of pip, from the keys of the given (stream, stream) pairs to their values.
+    """
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.FileHandler) or not isinstance(
+            handler, logging.StreamHandler
+        ):
+            continue
+        for old_stream, new_stream in streams:
+            if handler.stream is old_stream:
+                handler.stream = new_stream
+                break
+
+
+def _handle_connection(conn, handle_request):
+    request = next(_receive(conn), None)
+    if request is None:
+        # Closed without a request, e.g. by serve() checking for a daemon
+        return
+
+    cwd = os.getcwd()
+    environ = _pip_environ()
+    stdin, stdout, stderr = sys.stdin, sys.stdout, sys.stderr
+    try:
+        os.chdir(request["cwd"])
+        for name in environ:
+            del os.environ[name]
+        os.environ.update(request["environ"])
+        sys.stdin = io.StringIO(request.get("stdin", ""))
+        sys.stdout = _socket_stream(conn, "stdout")
+        sys.stderr = _socket_stream(conn, "stderr")
+        _redirect_log_handlers([(stdout, sys.stdout), (stderr, sys.stderr)])
+        try:
+            exit_code = handle_request(request["args"])
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+    finally:
+        # Including the handlers set up while handling the request
+        _redirect_log_handlers([(sys.stdout, stdout), (sys.stderr, stderr)])
+        sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+        for name in _pip_environ():
+            del os.environ[name]
+        os.environ.update(environ)
+        os.chdir(cwd)
+
+    _send(conn, {"exit": exit_code})
+
+
+def serve(socket_path, handle_request):
+    """
+    Accepts the requests of pip-compile-client on the Unix socket, one at a
+    time, until interrupted.
+
+    Each request runs handle_request(args) in the working directory and with
+    the PIP_* environment variables of the client, reading the standard input
+    sent by the client, while the standard output and error, and the log of
+    the root logger's stream handlers, are streamed back to the client.
+    handle_request returns the exit code of the client.
+    """
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        # No daemon is listening, remove the socket file it may have left
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    else:
+        raise OSError(f"A daemon is already listening on {socket_path}")
+    finally:
+        probe.close()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Only the current user may submit requests
+    umask = os.umask(0o077)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(umask)
+
+    try:
+        server.listen()
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    _handle_connection(conn, handle_request)
+                except (OSError, ValueError) as e:
+                    # The client went away or sent garbage, serve the next one
+                    print(f"Dropped a pip-compile request: {e!r}", file=sys.stderr)
+    finally:
+        server.close()
+        os.unlink(socket_path)
+
+
+def client(argv=None):
+    """
+    Entry point of pip-compile-client. Returns the exit code of pip-compile.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        sys.stdout.write(CLIENT_USAGE)
+        return 0 if argv else 2
+    socket_path, args = argv[0], argv[1:]
+
+    # The streams are looked up once, as the daemon may replace them when it
+    # runs in the same process
+    stdout, stderr = sys.stdout, sys.stderr
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return _compile_in_process(args)
+
+    request = {"args": args, "cwd": os.getcwd(), "environ": _pip_environ()}
+    if _reads_stdin(args):
+        request["stdin"] = sys.stdin.read()
+
+    with sock:
+        _send(sock, request)
+        for message in _receive(sock):
+            if "exit" in message:
+                return message["exit"]
+            stream = stdout if message["stream"] == "stdout" else stderr
+            stream.write(message["data"])
+            stream.flush()
+
+    stderr.write("The pip-compile daemon closed the connection.\n")
+    return 1
+
+
+def _compile_in_process(args):
+    from piptools.scripts.compile import cli
+
+    try:
+        cli.main(args, prog_name="pip-compile")
+    except SystemExit as e:
+        return e.code
+    return 0
@@ -1,6 +1,3 @@
-from pip._internal.utils.misc import redact_auth_from_url
-
-
 class PipToolsError(Exception):
     pass
 
@@ -12,6 +9,8 @@ class NoCandidateFound(PipToolsError):
         self.finder = finder
 
     def __str__(self):
+        from pip._internal.utils.misc import redact_auth_from_url
+
         versions = []
         pre_versions = []
 
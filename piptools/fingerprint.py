@@ -0,0 +1,215 @@
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+
+import pip
+from click.utils import LazyFile
+
+from .utils import COMPILE_EXCLUDE_OPTIONS
+
+# Bump to invalidate all stored fingerprints when what they cover changes
+FINGERPRINT_VERSION = 3
+
+# Nested requirement or constraint files, followed to fingerprint their content
+_NESTED_FILE_RE = re.compile(r"^(?:-r|--requirement|-c|--constraint)[\s=]*(\S+)")
+
+# Local projects and archives, whose content is not followed
+_LOCAL_PATH_RE = re.compile(r"^(?:(?:-e|--editable)[\s=]*)?(?:\.|/|~|file:)")
+
+# Editable requirements, whose content is not followed
+_EDITABLE_RE = re.compile(r"^(?:-e|--editable)\b")
+
+# VCS URLs, up from the netloc
+_VCS_URL_RE = re.compile(r"\b(?:git|hg|svn|bzr)\+[a-z]+://(\S+)")
+
+# Commit hashes, the only revisions which can't move
+_COMMIT_HASH_RE = re.compile(r"^(?:[0-9a-f]{40}|[0-9a-f]{64})$")
+
+# Metadata files next to a setup.py which may declare its install_requires
+_SETUP_FILES = ("setup.py", "setup.cfg", "pyproject.toml")
+
+
+class _Unfingerprintable(Exception):
+    """The inputs can't be fingerprinted, so the compilation must always run."""
+
+
+def _requirement_lines(content):
+    for line in content.decode("utf-8", "replace").splitlines():
+        line = re.sub(r"(^|\s+)#.*$", "", line).strip()
+        if line:
+            yield line
+
+
+def _is_unpinned_vcs_requirement(line):
+    """
+    Returns whether the requirement line holds a VCS URL which is not pinned
+    to a commit hash, whose upstream can move while the line stays the same.
+    """
+    match = _VCS_URL_RE.search(line)
+    if match is None:
+        return False
+    # The revision follows an @ in the path, the netloc may hold a user name
+    _, _, path = match.group(1).split("#", 1)[0].partition("/")
+    _, at, revision = path.rpartition("@")
+    return not (at and _COMMIT_HASH_RE.match(revision))
+
+
+def _update_with_file(digest, path, seen):
+    path = os.path.abspath(path)
+    if path in seen:
+        return
+    seen.add(path)
+
+    try:
+        with open(path, "rb") as fp:
+            content = fp.read()
+    except OSError:
+        raise _Unfingerprintable(path)
+
+    digest.update(path.encode("utf-8") + b"\0" + content + b"\0")
+
+    if os.path.basename(path) == "setup.py":
+        for name in _SETUP_FILES[1:]:
+            sibling = os.path.join(os.path.dirname(path), name)
+            if os.path.exists(sibling):
+                _update_with_file(digest, sibling, seen)
+        return
+
+    for line in _requirement_lines(content):
+        match = _NESTED_FILE_RE.match(line)
+        if match:
+            nested_path = match.group(1)
+            if "://" in nested_path:
+                raise _Unfingerprintable(nested_path)
+            _update_with_file(
+                digest, os.path.join(os.path.dirname(path), nested_path), seen
+            )
+        elif (
+            _LOCAL_PATH_RE.match(line)
+            or _EDITABLE_RE.match(line)
+            or _is_unpinned_vcs_requirement(line)
+        ):
+            raise _Unfingerprintable(line)
+
+
+def _update_with_pip_config_files(digest):
+    """
+    Updates the digest with the content of the pip configuration files, the
+    ones which don't exist included.
+    """
+    from pip._internal.configuration import get_configuration_files
+
+    paths = list(itertools.chain.from_iterable(get_configuration_files().values()))
+    if os.environ.get("PIP_CONFIG_FILE"):
+        paths.append(os.environ["PIP_CONFIG_FILE"])
+
+    for path in paths:
+        try:
+            with open(path, "rb") as fp:
+                content = fp.read()
+        except FileNotFoundError:
+            content = b""
+        except OSError:
+            raise _Unfingerprintable(path)
+        digest.update(b"config\0" + path.encode("utf-8") + b"\0" + content + b"\0")
+
+
+def _get_piptools_version():
+    """Returns the installed version of pip-tools, or None if not installed."""
+    from pip._vendor.pkg_resources import DistributionNotFound, get_distribution
+
+    try:
+        return get_distribution("pip-tools").version
+    except DistributionNotFound:
+        return None
+
+
+def compute_fingerprint(click_ctx, src_files, output_path):
+    """
+    Returns a digest of everything the compiled output file depends on, or
+    None if some input can't be fingerprinted (e.g. stdin, local projects,
+    editable requirements or VCS requirements not pinned to a commit).
+
+    The digest covers the compile options (except the ones listed in
+    COMPILE_EXCLUDE_OPTIONS), the content of the source files and of the
+    requirement files they include, the PIP_* environment variables, the pip
+    configuration files, the running Python and the current content of the
+    output file.
+    """
+    from piptools.scripts.compile import cli
+
+    if "-" in src_files or output_path == "-" or not os.path.exists(output_path):
+        return None
+
+    compile_options = {option.name: option for option in cli.params}
+    options = []
+    for option_name, value in sorted(click_ctx.params.items()):
+        option = compile_options[option_name]
+        if option.nargs < 0 or option.opts[-1] in COMPILE_EXCLUDE_OPTIONS:
+            continue
+        if isinstance(value, LazyFile):
+            value = value.name
+        options.append([option_name, value])
+
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(
+            {
+                "version": FINGERPRINT_VERSION,
+                "python": [sys.executable, sys.version, sys.platform],
+                # The resolver and the writer change with them
+                "pip": pip.__version__,
+                "pip-tools": _get_piptools_version(),
+                "options": options,
+                "environ": sorted(
+                    item for item in os.environ.items() if item[0].startswith("PIP_")
+                ),
+            },
+            default=str,
+        ).encode("utf-8")
+    )
+
+    seen = set()
+    try:
+        _update_with_pip_config_files(digest)
+        for src_file in src_files:
+            _update_with_file(digest, src_file, seen)
+    except _Unfingerprintable:
+        return None
+
+    # The output file comes last, it's not followed like the source files
+    with open(output_path, "rb") as fp:
+        digest.update(b"output\0" + fp.read())
+
+    return digest.hexdigest()
+
+
+def _fingerprint_path(cache_dir, output_path):
+    key = hashlib.sha224(os.path.abspath(output_path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, "fingerprints", key)
+
+
+def read_fingerprint(cache_dir, output_path):
+    """
+    Returns the fingerprint stored for the given output file, if any.
+    """
+    try:
+        with open(_fingerprint_path(cache_dir, output_path)) as fp:
+            return fp.read().strip()
+    except OSError:
+        return None
+
+
+def write_fingerprint(cache_dir, output_path, fingerprint):
+    """
+    Stores the fingerprint of the given output file in the cache directory.
+    """
+    path = _fingerprint_path(cache_dir, output_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as fp:
+        fp.write(fingerprint)
+    os.replace(tmp_path, path)
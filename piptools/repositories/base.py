@@ -18,6 +18,18 @@ class BaseRepository(metaclass=ABCMeta):
         InstallRequirement according to the repository.
         """
 
+    def prefetch_candidates(self, ireqs):
+        """
+        Hints that the best matches for the given InstallRequirements are
+        about to be looked up, so implementations may fetch them upfront.
+        """
+
+    def prefetch_dependencies(self, ireqs):
+        """
+        Hints that the dependencies of the given pinned InstallRequirements
+        are about to be looked up, so implementations may fetch them upfront.
+        """
+
     @abstractmethod
     def get_dependencies(self, ireq):
         """
@@ -34,6 +46,14 @@ class BaseRepository(metaclass=ABCMeta):
         editable or unpinned requirement to be passed to this function.
         """
 
+    def get_all_hashes(self, ireqs):
+        """
+        Given pinned InstallRequirements, returns a dict mapping each of them
+        to its set of hashes, like get_hashes() does. Implementations may
+        hash several requirements at a time.
+        """
+        return {ireq: self.get_hashes(ireq) for ireq in ireqs}
+
     @abstractmethod
     @contextmanager
     def allow_all_wheels(self):
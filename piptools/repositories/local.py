@@ -1,7 +1,5 @@
 from contextlib import contextmanager
 
-from pip._internal.utils.hashes import FAVORITE_HASH
-
 from piptools.utils import as_tuple, key_from_ireq, make_install_requirement
 
 from .base import BaseRepository
@@ -69,10 +67,46 @@ class LocalRequirementsRepository(BaseRepository):
         else:
             return self.repository.find_best_match(ireq, prereleases)
 
+    def prefetch_candidates(self, ireqs):
+        # Requirements satisfied by existing pins never reach the index
+        unpinned_ireqs = []
+        for ireq in ireqs:
+            existing_pin = self.existing_pins.get(key_from_ireq(ireq))
+            if not (
+                existing_pin and ireq_satisfied_by_existing_pin(ireq, existing_pin)
+            ):
+                unpinned_ireqs.append(ireq)
+        self.repository.prefetch_candidates(unpinned_ireqs)
+
+    def prefetch_dependencies(self, ireqs):
+        self.repository.prefetch_dependencies(ireqs)
+
     def get_dependencies(self, ireq):
         return self.repository.get_dependencies(ireq)
 
     def get_hashes(self, ireq):
+        hashes = self._get_existing_pin_hashes(ireq)
+        if hashes is not None:
+            return hashes
+        return self.repository.get_hashes(ireq)
+
+    def get_all_hashes(self, ireqs):
+        all_hashes = {}
+        missing_ireqs = []
+        for ireq in ireqs:
+            all_hashes[ireq] = self._get_existing_pin_hashes(ireq)
+            if all_hashes[ireq] is None:
+                missing_ireqs.append(ireq)
+        all_hashes.update(self.repository.get_all_hashes(missing_ireqs))
+        return all_hashes
+
+    def _get_existing_pin_hashes(self, ireq):
+        """
+        Return the hashes of the existing pin satisfying the given
+        InstallRequirement, or None if there are none to reuse.
+        """
+        from pip._internal.utils.hashes import FAVORITE_HASH
+
         existing_pin = self._reuse_hashes and self.existing_pins.get(
             key_from_ireq(ireq)
         )
@@ -83,7 +117,7 @@ class LocalRequirementsRepository(BaseRepository):
                 return {
                     ":".join([FAVORITE_HASH, hexdigest]) for hexdigest in hexdigests
                 }
-        return self.repository.get_hashes(ireq)
+        return None
 
     @contextmanager
     def allow_all_wheels(self):
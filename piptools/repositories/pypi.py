@@ -4,31 +4,28 @@ import itertools
 import logging
 import os
 import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from contextlib import contextmanager
+from functools import partial
+from html import unescape
 from shutil import rmtree
+from urllib.parse import urljoin, urlsplit, urlunsplit
 
 from click import progressbar
-from pip._internal.cache import WheelCache
-from pip._internal.cli.progress_bars import BAR_TYPES
 from pip._internal.commands import create_command
+from pip._internal.exceptions import PipError
 from pip._internal.models.index import PackageIndex, PyPI
-from pip._internal.models.link import Link
-from pip._internal.models.wheel import Wheel
-from pip._internal.req import RequirementSet
-from pip._internal.req.req_tracker import get_requirement_tracker
-from pip._internal.utils.hashes import FAVORITE_HASH
-from pip._internal.utils.logging import indent_log, setup_logging
-from pip._internal.utils.misc import normalize_path
-from pip._internal.utils.temp_dir import TempDirectory, global_tempdir_manager
-from pip._internal.utils.urls import path_to_url, url_to_path
-from pip._vendor import contextlib2
-from pip._vendor.requests import RequestException
 
 from .._compat import PIP_VERSION
+from ..cache import FileCache
 from ..exceptions import NoCandidateFound
 from ..logging import log
 from ..utils import (
     as_tuple,
+    format_requirement,
     is_pinned_requirement,
     is_url_requirement,
     lookup_table,
@@ -36,8 +33,40 @@ from ..utils import (
 )
 from .base import BaseRepository
 
-FILE_CHUNK_SIZE = 4096
-FileStream = collections.namedtuple("FileStream", "stream size")
+FILE_CHUNK_SIZE = 1024 * 1024
+MAX_CONCURRENT_REQUESTS = 8
+MAX_REQUESTS_PER_HOST = 4
+INDEX_PAGE_CACHE_SIZE = 100 * 1024 * 1024
+HASH_CACHE_SIZE = 10 * 1024 * 1024
+JSON_CACHE_SIZE = 50 * 1024 * 1024
+
+# Content types of the simple repository API, see PEP 691
+SIMPLE_INDEX_JSON = "application/vnd.pypi.simple.v1+json"
+SIMPLE_INDEX_HTML = "application/vnd.pypi.simple.v1+html"
+SIMPLE_INDEX_ACCEPT = (
+    f"{SIMPLE_INDEX_JSON}, {SIMPLE_INDEX_HTML};q=0.2, text/html;q=0.01"
+)
+FileStream = collections.namedtuple("FileStream", "stream size etag")
+
+
+class RepositoryMemos:
+    """
+    The in-memory caches of the documents a PyPIRepository fetched, which
+    don't depend on its options, keyed by URL. Repositories with different
+    options (e.g. the compilations of a batch) can share them: each one
+    only looks up the URLs of its own indexes.
+    """
+
+    def __init__(self):
+        # stores index page URL => links mappings
+        self.index_page_links = {}
+
+        # stores file URL => hashes mappings of the files having a metadata
+        # file next to them on the index, see PEP 658
+        self.metadata_file_hashes = {}
+
+        # stores URL => document mappings of the PyPI JSON API
+        self.json_documents = {}
 
 
 class PyPIRepository(BaseRepository):
@@ -51,10 +80,14 @@ class PyPIRepository(BaseRepository):
     changed/configured on the Finder.
     """
 
-    def __init__(self, pip_args, cache_dir):
+    def __init__(self, pip_args, cache_dir, jobs=1, max_index_age=0, memos=None):
         # Use pip's parser for pip.conf management and defaults.
         # General options (find_links, index_url, extra_index_url, trusted_host,
         # and pre) are deferred to pip.
+        from pip._internal.utils.misc import normalize_path
+
+        self._pip_args = list(pip_args)
+        self.jobs = jobs
         self.command = create_command("install")
         extra_pip_args = (
             []
@@ -72,6 +105,7 @@ class PyPIRepository(BaseRepository):
         self.finder = self.command._build_package_finder(
             options=self.options, session=self.session
         )
+        self.finder.process_project_url = self._process_project_url
 
         # Caches
         # stores project_name => InstallationCandidate mappings for all
@@ -79,6 +113,11 @@ class PyPIRepository(BaseRepository):
         # project
         self._available_candidates_cache = {}
 
+        # the same for wheels of all platforms and Python versions, see
+        # allow_all_wheels()
+        self._all_wheels_candidates_cache = {}
+        self._all_wheels_allowed = False
+
         # stores InstallRequirement => list(InstallRequirement) mappings
         # of all secondary dependencies for the given requirement, so we
         # only have to go to disk once for each requirement
@@ -88,6 +127,31 @@ class PyPIRepository(BaseRepository):
         self._build_dir = None
         self._source_dir = None
         self._cache_dir = normalize_path(str(cache_dir))
+
+        # the documents fetched by this repository, and maybe by others
+        self.memos = RepositoryMemos() if memos is None else memos
+
+        # stores the links of remote index pages across runs, they are reused
+        # without asking the index for up to max_index_age seconds
+        self.max_index_age = max_index_age
+        self._index_page_cache = FileCache(
+            self._cache_dir, "index-pages", max_size=INDEX_PAGE_CACHE_SIZE
+        )
+
+        # stores URL => (size, validator, hash) mappings of hashed files
+        self._hash_cache = FileCache(
+            self._cache_dir, "hashes", max_size=HASH_CACHE_SIZE
+        )
+
+        # stores URL => document mappings of the PyPI JSON API, see _get_json()
+        self._json_cache = FileCache(
+            self._cache_dir, "pypi-json", max_size=JSON_CACHE_SIZE
+        )
+
+        # limits the concurrent requests to each host while hashing in parallel
+        self._host_semaphores = {}
+        self._host_semaphores_lock = threading.Lock()
+        self._hashing_in_parallel = False
         self._download_dir = os.path.join(self._cache_dir, "pkgs")
         if PIP_VERSION[:2] <= (20, 2):
             self._wheel_download_dir = os.path.join(self._cache_dir, "wheels")
@@ -120,15 +184,199 @@ class PyPIRepository(BaseRepository):
 
     def clear_caches(self):
         rmtree(self._download_dir, ignore_errors=True)
+        self._index_page_cache.clear()
+        self._hash_cache.clear()
+        self._json_cache.clear()
         if PIP_VERSION[:2] <= (20, 2):
             rmtree(self._wheel_download_dir, ignore_errors=True)
 
     def find_all_candidates(self, req_name):
         if req_name not in self._available_candidates_cache:
-            candidates = self.finder.find_all_candidates(req_name)
+            candidates = self._find_all_candidates(req_name)
             self._available_candidates_cache[req_name] = candidates
         return self._available_candidates_cache[req_name]
 
+    def _find_all_candidates(self, req_name):
+        from pip._internal.index.package_finder import PackageFinder
+
+        if self._all_wheels_allowed:
+            # Since pip 20.3 the finder caches the candidates it finds for the
+            # current platform, bypass that cache.
+            find_all_candidates = getattr(
+                PackageFinder.find_all_candidates,
+                "__wrapped__",
+                PackageFinder.find_all_candidates,
+            )
+            return find_all_candidates(self.finder, req_name)
+        return self.finder.find_all_candidates(req_name)
+
+    def _process_project_url(self, project_url, link_evaluator):
+        """
+        Replaces PackageFinder.process_project_url to read the links of remote
+        index pages from the index page cache.
+        """
+        from pip._internal.index.package_finder import PackageFinder
+        from pip._internal.utils.logging import indent_log
+
+        if project_url.scheme not in ("http", "https"):
+            return PackageFinder.process_project_url(
+                self.finder, project_url, link_evaluator
+            )
+
+        links = self._get_index_page_links(project_url)
+        if links is None:
+            # Let pip fetch the page and report whatever goes wrong
+            return PackageFinder.process_project_url(
+                self.finder, project_url, link_evaluator
+            )
+
+        with indent_log():
+            return self.finder.evaluate_links(link_evaluator, links=links)
+
+    def _get_index_page_links(self, project_url):
+        """
+        Return the links of a remote index page, which is fetched only once.
+        Return None if the page can't be fetched as JSON or HTML.
+        """
+        from pip._internal.models.link import Link
+        from pip._internal.utils.misc import redact_auth_from_url
+
+        url = project_url.url_without_fragment
+        if url not in self.memos.index_page_links:
+            entry = self._fetch_index_page(project_url)
+            if entry is None:
+                return None
+
+            links = []
+            for link_url, requires_python, yanked_reason, metadata in entry["links"]:
+                link = Link(
+                    link_url,
+                    # Logged as is, unlike the URL of the link
+                    comes_from=redact_auth_from_url(entry["url"]),
+                    requires_python=requires_python,
+                    yanked_reason=yanked_reason,
+                )
+                if metadata is not None:
+                    self.memos.metadata_file_hashes[
+                        link.url_without_fragment
+                    ] = metadata
+                links.append(link)
+            self.memos.index_page_links[url] = links
+        return self.memos.index_page_links[url]
+
+    def _fetch_index_page(self, project_url):
+        """
+        Fetch a remote index page, in the JSON format of PEP 691 if the index
+        supports it, and return its links as a JSON serializable dict. The
+        page is cached along with its ETag and Last-Modified headers, so the
+        index only has to confirm that it did not change. Pages which are not
+        found have no links. Return None if the page can't be fetched as JSON
+        or HTML.
+
+        The credentials of the index are never written to the cache, they are
+        put back into the URLs of the cached page when it is read.
+        """
+        from pip._internal.index.collector import _get_encoding_from_headers
+        from pip._internal.utils.misc import remove_auth_from_url
+        from pip._vendor.requests import RequestException
+
+        url = project_url.url_without_fragment
+        cache_key = remove_auth_from_url(url)
+        entry = self._index_page_cache.get(cache_key)
+        if entry is not None:
+            entry = _map_index_page_urls(entry, partial(_add_auth_to_url, url))
+        if entry is not None and time.time() - entry["fetched"] < self.max_index_age:
+            log.debug(f"Using cached index page {project_url.show_url}")
+            return entry
+
+        headers = {"Accept": SIMPLE_INDEX_ACCEPT, "Cache-Control": "max-age=0"}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = self.session.get(url, headers=headers)
+        except RequestException as e:
+            if entry is None:
+                return None
+            log.debug(f"Couldn't revalidate {project_url.show_url}, using cache: {e}")
+            return entry
+
+        if response.status_code == 304 and entry is not None:
+            entry["fetched"] = time.time()
+            self._set_index_page_entry(cache_key, entry)
+            return entry
+
+        if response.status_code == 404:
+            # Like pip, skip the page, and remember that it doesn't exist
+            log.debug(f"Could not find index page {project_url.show_url}")
+            entry = {
+                "url": response.url,
+                "etag": None,
+                "last_modified": None,
+                "fetched": time.time(),
+                "links": [],
+            }
+            self._set_index_page_entry(cache_key, entry)
+            return entry
+
+        if response.status_code != 200:
+            return None
+
+        content_type = response.headers.get("Content-Type", "").lower()
+        if content_type.startswith(SIMPLE_INDEX_JSON):
+            try:
+                links = _parse_simple_json(response.url, response.json())
+            except (ValueError, KeyError, TypeError) as e:
+                log.debug(f"Cannot parse JSON index page {project_url.show_url}: {e}")
+                return None
+        elif content_type.startswith(("text/html", SIMPLE_INDEX_HTML)):
+            links = _parse_simple_html(
+                response.url,
+                response.content,
+                _get_encoding_from_headers(response.headers),
+            )
+        else:
+            return None
+
+        entry = {
+            "url": response.url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched": time.time(),
+            "links": links,
+        }
+        self._set_index_page_entry(cache_key, entry)
+        return entry
+
+    def _set_index_page_entry(self, cache_key, entry):
+        from pip._internal.utils.misc import remove_auth_from_url
+
+        self._index_page_cache.set(
+            cache_key, _map_index_page_urls(entry, remove_auth_from_url)
+        )
+
+    def prefetch_candidates(self, ireqs):
+        """
+        Fetch the candidates of all the given InstallRequirements which are
+        not cached yet concurrently, sharing the session's connection pool.
+        """
+        req_names = sorted(
+            {ireq.name for ireq in ireqs} - self._available_candidates_cache.keys()
+        )
+        if len(req_names) < 2:
+            return
+
+        log.debug(f"Prefetching candidates for {len(req_names)} packages")
+        max_workers = min(len(req_names), MAX_CONCURRENT_REQUESTS)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            all_candidates = executor.map(self._find_all_candidates, req_names)
+            # Results are yielded in the order of req_names
+            for req_name, candidates in zip(req_names, all_candidates):
+                self._available_candidates_cache[req_name] = candidates
+
     def find_best_match(self, ireq, prereleases=None):
         """
         Returns a Version object that indicates the best match for the given
@@ -137,6 +385,21 @@ class PyPIRepository(BaseRepository):
         if ireq.editable or is_url_requirement(ireq):
             return ireq  # return itself as the best match
 
+        best_candidate = self._find_best_candidate(ireq, prereleases)
+
+        # Turn the candidate into a pinned InstallRequirement
+        return make_install_requirement(
+            best_candidate.name,
+            best_candidate.version,
+            ireq.extras,
+            constraint=ireq.constraint,
+        )
+
+    def _find_best_candidate(self, ireq, prereleases=None):
+        """
+        Returns the best InstallationCandidate for the given InstallRequirement
+        among the cached candidates of the project.
+        """
         all_candidates = self.find_all_candidates(ireq.name)
         candidates_by_version = lookup_table(all_candidates, key=lambda c: c.version)
         matching_versions = ireq.specifier.filter(
@@ -153,17 +416,14 @@ class PyPIRepository(BaseRepository):
 
         evaluator = self.finder.make_candidate_evaluator(ireq.name)
         best_candidate_result = evaluator.compute_best_candidate(matching_candidates)
-        best_candidate = best_candidate_result.best_candidate
-
-        # Turn the candidate into a pinned InstallRequirement
-        return make_install_requirement(
-            best_candidate.name,
-            best_candidate.version,
-            ireq.extras,
-            constraint=ireq.constraint,
-        )
+        return best_candidate_result.best_candidate
 
     def resolve_reqs(self, download_dir, ireq, wheel_cache):
+        from pip._internal.req import RequirementSet
+        from pip._internal.req.req_tracker import get_requirement_tracker
+        from pip._internal.utils.logging import indent_log
+        from pip._internal.utils.temp_dir import TempDirectory
+
         with get_requirement_tracker() as req_tracker, TempDirectory(
             kind="resolver"
         ) as temp_dir, indent_log():
@@ -206,6 +466,11 @@ class PyPIRepository(BaseRepository):
                     resolver._get_abstract_dist_for(ireq)
                 else:
                     resolver._get_dist_for(ireq)
+            elif PIP_VERSION[:2] >= (20, 3) and download_dir is not None:
+                # Since pip 20.3 only `pip download` keeps the downloaded
+                # files, keep them as well so they don't have to be
+                # downloaded again for hashing
+                preparer.save_linked_requirement(ireq)
 
         return set(results)
 
@@ -215,6 +480,9 @@ class PyPIRepository(BaseRepository):
         dependencies (also InstallRequirements, but not necessarily pinned).
         They indicate the secondary dependencies for the given requirement.
         """
+        from pip._internal.cache import WheelCache
+        from pip._internal.utils.temp_dir import global_tempdir_manager
+
         if not (
             ireq.editable or is_url_requirement(ireq) or is_pinned_requirement(ireq)
         ):
@@ -223,6 +491,14 @@ class PyPIRepository(BaseRepository):
             )
 
         if ireq not in self._dependencies_cache:
+            if is_pinned_requirement(ireq) and not is_url_requirement(ireq):
+                # Reading the metadata of a distribution is much cheaper than
+                # letting pip download and prepare the whole distribution
+                dependencies = self._get_dependencies_from_metadata(ireq)
+                if dependencies is not None:
+                    self._dependencies_cache[ireq] = dependencies
+                    return dependencies
+
             if ireq.editable and (ireq.source_dir and os.path.exists(ireq.source_dir)):
                 # No download_dir for locally available editable requirements.
                 # If a download_dir is passed, pip will unnecessarily archive
@@ -246,6 +522,194 @@ class PyPIRepository(BaseRepository):
 
         return self._dependencies_cache[ireq]
 
+    def _get_dependencies_from_metadata(self, ireq):
+        """
+        Given a pinned InstallRequirement, return its dependencies by reading
+        only the metadata of the file it would be installed from: either the
+        metadata file the index serves next to it (see PEP 658), or the
+        METADATA file of a wheel. Return None if neither is available or if
+        the metadata can't be read.
+        """
+        from pip._internal.req.constructors import install_req_from_req_string
+        from pip._vendor.requests import RequestException
+
+        try:
+            best_candidate = self._find_best_candidate(ireq)
+        except NoCandidateFound:
+            return None
+        if best_candidate is None:
+            return None
+
+        link = best_candidate.link
+        metadata_file_hashes = self.memos.metadata_file_hashes.get(
+            link.url_without_fragment
+        )
+        if metadata_file_hashes is None and not link.is_wheel:
+            return None
+
+        try:
+            dist = None
+            if metadata_file_hashes is not None:
+                dist = self._get_metadata_file_distribution(
+                    ireq.name, link, metadata_file_hashes
+                )
+            if dist is None and link.is_wheel:
+                dist = self._get_wheel_distribution(ireq.name, link)
+        except (PipError, RequestException, zipfile.BadZipFile, OSError) as e:
+            log.debug(f"Couldn't read metadata from {link.show_url}: {e}")
+            return None
+        if dist is None:
+            return None
+
+        # Select the dependencies the way pip does, see
+        # pip._internal.resolution.legacy.resolver.Resolver._resolve_one
+        available_extras = sorted(set(dist.extras) & set(ireq.extras))
+        dependencies = set()
+        for requirement in dist.requires(available_extras):
+            dependency = install_req_from_req_string(str(requirement), comes_from=ireq)
+            if dependency.match_markers(available_extras):
+                dependencies.add(dependency)
+        return dependencies
+
+    def _get_metadata_file_distribution(self, name, link, hashes):
+        """
+        Return a pkg_resources distribution holding the metadata file served
+        next to the given file by the index. Return None if the metadata file
+        doesn't match the given hashes.
+        """
+        from pip._internal.utils.misc import redact_auth_from_url
+
+        url = f"{link.url_without_fragment}.metadata"
+        response = self.session.get(url)
+        response.raise_for_status()
+        metadata = response.content
+
+        for hash_name, hash_value in hashes.items():
+            if hash_name not in hashlib.algorithms_guaranteed:
+                continue
+            if hashlib.new(hash_name, metadata).hexdigest() != hash_value:
+                log.debug(
+                    f"Ignoring {redact_auth_from_url(url)}, its hash doesn't match"
+                )
+                return None
+        return _make_metadata_distribution(metadata, name, url)
+
+    def _get_wheel_distribution(self, name, link):
+        """
+        Return a pkg_resources distribution holding only the METADATA file of
+        a local or remote wheel. Remote wheels are read with HTTP range
+        requests, so only the zip's central directory and the METADATA file
+        are downloaded. Return None if range requests are not supported.
+        """
+        if link.is_file:
+            with zipfile.ZipFile(link.file_path) as wheel_zip:
+                return _read_wheel_distribution(wheel_zip, name, link.file_path)
+
+        if PIP_VERSION[:2] <= (20, 1):
+            return None
+
+        from pip._internal.network.lazy_wheel import (
+            HTTPRangeRequestUnsupported,
+            LazyZipOverHTTP,
+        )
+
+        url = link.url_without_fragment
+        try:
+            with LazyZipOverHTTP(url, self.session) as wheel:
+                return _read_wheel_distribution(zipfile.ZipFile(wheel), name, url)
+        except HTTPRangeRequestUnsupported:
+            log.debug(f"Range requests are not supported by {link.show_url}")
+            return None
+
+    def prefetch_dependencies(self, ireqs):
+        """
+        Get the dependencies of all the given pinned InstallRequirements which
+        are not cached yet in a pool of `self.jobs` worker processes. Every
+        worker has its own repository and fresh build caches for each
+        requirement.
+        """
+        from pip._internal.req.constructors import install_req_from_line
+
+        if self.jobs <= 1:
+            return
+
+        ireqs = [
+            ireq
+            for ireq in ireqs
+            if is_pinned_requirement(ireq)
+            and not is_url_requirement(ireq)
+            and ireq not in self._dependencies_cache
+        ]
+        if len(ireqs) < 2:
+            return
+
+        log.debug(f"Getting dependencies of {len(ireqs)} packages in parallel")
+        with ProcessPoolExecutor(
+            max_workers=min(len(ireqs), self.jobs),
+            initializer=_init_dependencies_worker,
+            initargs=(
+                self._pip_args,
+                self._get_finder_options(),
+                self._cache_dir,
+                self.max_index_age,
+                log.verbosity,
+            ),
+        ) as executor:
+            futures = {
+                ireq: executor.submit(_get_dependencies_in_worker, str(ireq.req))
+                for ireq in ireqs
+            }
+            for ireq, future in futures.items():
+                try:
+                    dependencies = future.result()
+                except Exception as e:
+                    # Left to get_dependencies(), which reports the error
+                    log.debug(
+                        f"Couldn't get the dependencies of {ireq} in parallel: {e}"
+                    )
+                    continue
+                self._dependencies_cache[ireq] = {
+                    install_req_from_line(dependency, comes_from=ireq)
+                    for dependency in dependencies
+                }
+
+    def _get_finder_options(self):
+        """
+        Return the options of the finder as a picklable dict, including those
+        set by the option lines of the requirement files, which are not in the
+        pip arguments.
+        """
+        return {
+            "index_urls": list(self.finder.index_urls),
+            "find_links": list(self.finder.find_links),
+            "trusted_hosts": list(self.finder.trusted_hosts),
+            "no_binary": set(self.finder.format_control.no_binary),
+            "only_binary": set(self.finder.format_control.only_binary),
+            "allow_all_prereleases": self.finder.allow_all_prereleases,
+            "prefer_binary": self.finder.prefer_binary,
+        }
+
+    def _set_finder_options(self, finder_options):
+        """
+        Apply the options returned by _get_finder_options() to the finder, like
+        pip does for the option lines of a requirement file.
+        """
+        from pip._internal.models.search_scope import SearchScope
+
+        index_urls = finder_options["index_urls"]
+        self.session.update_index_urls(index_urls)
+        self.finder.search_scope = SearchScope(
+            find_links=finder_options["find_links"], index_urls=index_urls
+        )
+        for host in finder_options["trusted_hosts"]:
+            self.session.add_trusted_host(host, suppress_logging=True)
+        self.finder.format_control.no_binary = finder_options["no_binary"]
+        self.finder.format_control.only_binary = finder_options["only_binary"]
+        if finder_options["allow_all_prereleases"]:
+            self.finder.set_allow_all_prereleases()
+        if finder_options["prefer_binary"]:
+            self.finder.set_prefer_binary()
+
     def copy_ireq_dependencies(self, source, dest):
         try:
             self._dependencies_cache[dest] = self._dependencies_cache[source]
@@ -259,6 +723,10 @@ class PyPIRepository(BaseRepository):
         InstallRequirement. Return None on HTTP/JSON error or if a package
         is not found on PyPI server.
 
+        For a pinned requirement, the info is fetched from the smaller
+        endpoint of its version, if the server has it, and holds only the
+        files of that release.
+
         API reference: https://warehouse.readthedocs.io/api-reference/json/
         """
         package_indexes = (
@@ -266,25 +734,109 @@ class PyPIRepository(BaseRepository):
             for index_url in self.finder.search_scope.index_urls
         )
         for package_index in package_indexes:
-            url = f"{package_index.pypi_url}/{ireq.name}/json"
+            project_url = f"{package_index.pypi_url}/{ireq.name}/json"
+            if not is_pinned_requirement(ireq):
+                endpoints = [(project_url, project_url, None)]
+            else:
+                _, version, _ = as_tuple(ireq)
+                release_url = f"{package_index.pypi_url}/{ireq.name}/{version}/json"
+                endpoints = [
+                    (
+                        release_url,
+                        release_url,
+                        partial(_select_release_files, version, "urls"),
+                    ),
+                    (
+                        project_url,
+                        f"{project_url}#{version}",
+                        partial(_select_release_files, version, "releases"),
+                    ),
+                ]
+
+            for url, cache_key, select in endpoints:
+                data = self._get_json(url, cache_key, select)
+                if data is not None:
+                    return data
+        return None
+
+    def _get_json(self, url, cache_key, select=None):
+        """
+        Return the JSON document at the given URL, or the part of it chosen by
+        the select function. Return None on HTTP/JSON error or if the
+        document is not found.
+
+        Documents are fetched once, and cached in the cache dir along with
+        the ETag and Last-Modified headers of the response, so the server only
+        has to confirm that they did not change. The credentials of the index
+        are never written to the cache.
+        """
+        from pip._internal.utils.misc import redact_auth_from_url, remove_auth_from_url
+        from pip._vendor.requests import RequestException
+
+        cache_key = remove_auth_from_url(cache_key)
+        if cache_key in self.memos.json_documents:
+            return self.memos.json_documents[cache_key]
+
+        headers = {}
+        entry = self._json_cache.get(cache_key)
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with self._limit_requests(url):
             try:
-                response = self.session.get(url)
+                response = self.session.get(url, headers=headers)
             except RequestException as e:
-                log.debug(f"Fetch package info from PyPI failed: {url}: {e}")
-                continue
+                log.debug(
+                    "Fetch package info from PyPI failed: "
+                    f"{redact_auth_from_url(url)}: {e}"
+                )
+                return None
 
+            if response.status_code == 304 and entry is not None:
+                data = entry["data"]
             # Skip this PyPI server, because there is no package
             # or JSON API might be not supported
-            if response.status_code == 404:
-                continue
+            elif response.status_code == 404:
+                return None
+            else:
+                try:
+                    data = response.json()
+                except ValueError as e:
+                    log.debug(
+                        "Cannot parse JSON response from PyPI: "
+                        f"{redact_auth_from_url(url)}: {e}"
+                    )
+                    return None
+                if select is not None:
+                    data = select(data)
+                self._json_cache.set(
+                    cache_key,
+                    {
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                        "data": data,
+                    },
+                )
 
-            try:
-                data = response.json()
-            except ValueError as e:
-                log.debug(f"Cannot parse JSON response from PyPI: {url}: {e}")
-                continue
-            return data
-        return None
+        self.memos.json_documents[cache_key] = data
+        return data
+
+    @contextmanager
+    def _limit_requests(self, url):
+        """
+        Waits until less than MAX_REQUESTS_PER_HOST requests to the host of
+        the given URL are running.
+        """
+        host = urlsplit(url).netloc
+        with self._host_semaphores_lock:
+            semaphore = self._host_semaphores.setdefault(
+                host, threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+            )
+        with semaphore:
+            yield
 
     def _get_download_path(self, ireq):
         """
@@ -306,6 +858,8 @@ class PyPIRepository(BaseRepository):
         of the files for a given requirement. Unhashable requirements return an
         empty set. Unpinned requirements raise a TypeError.
         """
+        from pip._internal.models.link import Link
+        from pip._internal.utils.urls import path_to_url
 
         if ireq.link:
             link = ireq.link
@@ -340,11 +894,44 @@ class PyPIRepository(BaseRepository):
 
         return hashes
 
+    def get_all_hashes(self, ireqs):
+        """
+        Given pinned InstallRequirements, returns a dict mapping each of them
+        to its set of hashes. Up to MAX_CONCURRENT_REQUESTS requirements are
+        hashed at a time, with up to MAX_REQUESTS_PER_HOST requests to the
+        same host.
+        """
+        ireqs = list(ireqs)
+        if len(ireqs) < 2:
+            return super().get_all_hashes(ireqs)
+
+        log.debug(f"Hashing {len(ireqs)} packages in parallel")
+        all_hashes = {}
+        # Progress bars of concurrent downloads would garble each other
+        self._hashing_in_parallel = True
+        try:
+            max_workers = min(len(ireqs), MAX_CONCURRENT_REQUESTS)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(self.get_hashes, ireq): ireq for ireq in ireqs
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    ireq = futures[future]
+                    all_hashes[ireq] = future.result()
+                    log.debug(f"[{done}/{len(ireqs)}] {format_requirement(ireq)}")
+        finally:
+            self._hashing_in_parallel = False
+
+        # Keep the order of the given requirements
+        return {ireq: all_hashes[ireq] for ireq in ireqs}
+
     def _get_hashes_from_pypi(self, ireq):
         """
         Return a set of hashes from PyPI JSON API for a given InstallRequirement.
         Return None if fetching data is failed or missing digests.
         """
+        from pip._internal.utils.hashes import FAVORITE_HASH
+
         project = self._get_project(ireq)
         if project is None:
             return None
@@ -384,36 +971,104 @@ class PyPIRepository(BaseRepository):
         matching_candidates = candidates_by_version[matching_versions[0]]
 
         return {
-            self._get_file_hash(candidate.link) for candidate in matching_candidates
+            self._get_candidate_file_hash(candidate.link)
+            for candidate in matching_candidates
         }
 
+    def _get_candidate_file_hash(self, link):
+        """
+        Return the hash of a release file, reading it from the download dir if
+        it was downloaded while getting dependencies.
+
+        The download dir is kept across runs and shared by all the indexes, so
+        the downloaded file is only used if it matches the hash of the link.
+        """
+        from pip._internal.exceptions import HashMismatch
+        from pip._internal.models.link import Link
+        from pip._internal.utils.hashes import FAVORITE_HASH, Hashes
+        from pip._internal.utils.urls import path_to_url
+
+        downloaded_path = os.path.join(self._download_dir, link.filename)
+        if not link.hash or not os.path.isfile(downloaded_path):
+            return self._get_file_hash(link)
+
+        downloaded_link = Link(path_to_url(downloaded_path))
+        if link.hash_name == FAVORITE_HASH:
+            file_hash = self._get_file_hash(downloaded_link)
+            if file_hash == f"{FAVORITE_HASH}:{link.hash}":
+                return file_hash
+            return self._get_file_hash(link)
+
+        try:
+            Hashes({link.hash_name: [link.hash]}).check_against_path(downloaded_path)
+        except HashMismatch:
+            return self._get_file_hash(link)
+        return self._get_file_hash(downloaded_link)
+
     def _get_file_hash(self, link):
+        from pip._internal.utils.misc import remove_auth_from_url
+        from pip._vendor.requests import RequestException
+
+        # A file with the same URL, size and ETag has the same content, so its
+        # hash can be reused without downloading it, the size and ETag of a
+        # remote file are revalidated with a HEAD request
+        cache_key = remove_auth_from_url(link.url_without_fragment)
+        entry = self._hash_cache.get(cache_key)
+
+        with self._limit_requests(link.url):
+            if entry is not None:
+                try:
+                    size, etag = stat_local_or_remote_file(link, self.session)
+                except (RequestException, OSError) as e:
+                    log.debug(f"Couldn't revalidate {link.show_url}: {e}")
+                else:
+                    if etag and [size, etag] == [entry["size"], entry["etag"]]:
+                        log.debug(f"Using cached hash of {link.show_url}")
+                        return entry["hash"]
+
+            with open_local_or_remote_file(link, self.session) as f:
+                file_hash = self._hash_file_stream(link, f)
+
+        if f.size is not None and f.etag:
+            self._hash_cache.set(
+                cache_key, {"size": f.size, "etag": f.etag, "hash": file_hash}
+            )
+        return file_hash
+
+    def _hash_file_stream(self, link, f):
+        from pip._internal.utils.hashes import FAVORITE_HASH
+        from pip._vendor import contextlib2
+
         log.debug(f"Hashing {link.show_url}")
         h = hashlib.new(FAVORITE_HASH)
-        with open_local_or_remote_file(link, self.session) as f:
-            # Chunks to iterate
-            chunks = iter(lambda: f.stream.read(FILE_CHUNK_SIZE), b"")
-
-            # Choose a context manager depending on verbosity
-            if log.verbosity >= 1:
-                iter_length = f.size / FILE_CHUNK_SIZE if f.size else None
-                bar_template = f"{' ' * log.current_indent}  |%(bar)s| %(info)s"
-                context_manager = progressbar(
-                    chunks,
-                    length=iter_length,
-                    # Make it look like default pip progress bar
-                    fill_char="█",
-                    empty_char=" ",
-                    bar_template=bar_template,
-                    width=32,
-                )
-            else:
-                context_manager = contextlib2.nullcontext(chunks)
+        # Chunks to iterate, small files are read at once
+        chunk_size = min(f.size or FILE_CHUNK_SIZE, FILE_CHUNK_SIZE) or 1
+        if link.is_file:
+            chunks = _iter_chunks_into_buffer(f.stream, chunk_size)
+        else:
+            chunks = iter(lambda: f.stream.read(chunk_size), b"")
+
+        # Choose a context manager depending on verbosity
+        if log.verbosity >= 1 and not self._hashing_in_parallel:
+            iter_length = f.size / chunk_size if f.size else None
+            bar_template = f"{' ' * log.current_indent}  |%(bar)s| %(info)s"
+            context_manager = progressbar(
+                chunks,
+                length=iter_length,
+                # Make it look like default pip progress bar
+                fill_char="█",
+                empty_char=" ",
+                bar_template=bar_template,
+                width=32,
+            )
+        else:
+            context_manager = contextlib2.nullcontext(chunks)
+
+        # Iterate over the chosen context manager
+        with context_manager as bar:
+            for chunk in bar:
+                h.update(chunk)
 
-            # Iterate over the chosen context manager
-            with context_manager as bar:
-                for chunk in bar:
-                    h.update(chunk)
         return ":".join([FAVORITE_HASH, h.hexdigest()])
 
     @contextmanager
@@ -421,9 +1076,12 @@ class PyPIRepository(BaseRepository):
         """
         Monkey patches pip.Wheel to allow wheels from all platforms and Python versions.
 
-        This also saves the candidate cache and set a new one, or else the results from
-        the previous non-patched calls will interfere.
+        This also switches to a separate candidate cache, or else the results from
+        the previous non-patched calls will interfere. The candidates are found in
+        the links of the index pages fetched before, so the index pages are not
+        fetched again.
         """
+        from pip._internal.models.wheel import Wheel
 
         def _wheel_supported(self, tags=None):
             # Ignore current platform. Support everything.
@@ -439,7 +1097,8 @@ class PyPIRepository(BaseRepository):
 
         Wheel.supported = _wheel_supported
         Wheel.support_index_min = _wheel_support_index_min
-        self._available_candidates_cache = {}
+        self._available_candidates_cache = self._all_wheels_candidates_cache
+        self._all_wheels_allowed = True
 
         try:
             yield
@@ -447,12 +1106,16 @@ class PyPIRepository(BaseRepository):
             Wheel.supported = original_wheel_supported
             Wheel.support_index_min = original_support_index_min
             self._available_candidates_cache = original_cache
+            self._all_wheels_allowed = False
 
     def _setup_logging(self):
         """
         Setup pip's logger. Ensure pip is verbose same as pip-tools and sync
         pip's log stream with LogContext.stream.
         """
+        from pip._internal.cli.progress_bars import BAR_TYPES
+        from pip._internal.utils.logging import setup_logging
+
         # Default pip's logger is noisy, so decrease it's verbosity
         setup_logging(
             verbosity=log.verbosity - 1,
@@ -477,6 +1140,215 @@ class PyPIRepository(BaseRepository):
             bar_cls.file = log.stream
 
 
+def _select_release_files(version, key, data):
+    """
+    Select the files of a release from a project info of the PyPI JSON API,
+    i.e. the "urls" of a version's info or the "releases" of a project's info.
+    """
+    files = data.get(key)
+    if key == "releases" and isinstance(files, dict):
+        files = files.get(version)
+    return {"releases": {} if files is None else {version: files}}
+
+
+def _map_index_page_urls(entry, function):
+    """
+    Return a copy of a cached index page, with the function applied to the
+    URLs of the page and of its links.
+    """
+    return dict(
+        entry,
+        url=function(entry["url"]),
+        links=[[function(link[0]), *link[1:]] for link in entry["links"]],
+    )
+
+
+def _add_auth_to_url(auth_url, url):
+    """
+    Return the URL with the credentials of auth_url if both have the same
+    host, like the links of an index page relative to a URL with credentials.
+    """
+    auth_netloc = urlsplit(auth_url).netloc
+    parts = urlsplit(url)
+    if parts.netloc != auth_netloc.rpartition("@")[2]:
+        return url
+    return urlunsplit(parts._replace(netloc=auth_netloc))
+
+
+def _iter_chunks_into_buffer(stream, chunk_size):
+    """
+    Yield the contents of a binary file in chunks, reusing a single buffer.
+    Every chunk is only valid until the next one is read.
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    while True:
+        size = stream.readinto(buffer)
+        if not size:
+            return
+        yield view[:size]
+
+
+def _parse_simple_json(page_url, document):
+    """
+    Return the links of a project page in the JSON format of PEP 691, as
+    [url, requires_python, yanked_reason, metadata_file_hashes] lists.
+    """
+    from pip._internal.utils.hashes import FAVORITE_HASH
+
+    links = []
+    for file_ in document["files"]:
+        url = urljoin(page_url, file_["url"])
+        hashes = file_.get("hashes") or {}
+        if "#" not in url:
+            # pip reads the hash of a file from the URL's fragment
+            for hash_name in (FAVORITE_HASH, *sorted(hashes)):
+                if hash_name in hashes:
+                    url = f"{url}#{hash_name}={hashes[hash_name]}"
+                    break
+
+        yanked = file_.get("yanked", False)
+        if isinstance(yanked, str):
+            yanked_reason = yanked
+        else:
+            yanked_reason = "" if yanked else None
+
+        # PEP 714 renamed dist-info-metadata to core-metadata
+        metadata = file_.get("core-metadata", file_.get("dist-info-metadata"))
+        if isinstance(metadata, dict):
+            metadata_file_hashes = metadata
+        else:
+            metadata_file_hashes = {} if metadata else None
+
+        links.append(
+            [
+                url,
+                file_.get("requires-python") or None,
+                yanked_reason,
+                metadata_file_hashes,
+            ]
+        )
+    return links
+
+
+def _parse_simple_html(page_url, content, encoding):
+    """
+    Return the links of a project page in the HTML format of PEP 503, as
+    [url, requires_python, yanked_reason, metadata_file_hashes] lists. Like
+    pip's parse_links(), but it also reads the metadata files of PEP 658.
+    """
+    from pip._internal.index.collector import _clean_link, _determine_base_url
+    from pip._vendor import html5lib
+
+    document = html5lib.parse(
+        content, transport_encoding=encoding, namespaceHTMLElements=False
+    )
+    base_url = _determine_base_url(document, page_url)
+
+    links = []
+    for anchor in document.findall(".//a"):
+        href = anchor.get("href")
+        if not href:
+            continue
+        url = _clean_link(urljoin(base_url, href))
+
+        requires_python = anchor.get("data-requires-python")
+        requires_python = unescape(requires_python) if requires_python else None
+        yanked_reason = anchor.get("data-yanked")
+        if yanked_reason:
+            yanked_reason = unescape(yanked_reason)
+
+        # The value is either "true" or "<hash name>=<hash value>"
+        metadata = anchor.get(
+            "data-core-metadata", anchor.get("data-dist-info-metadata")
+        )
+        if metadata is None:
+            metadata_file_hashes = None
+        else:
+            hash_name, sep, hash_value = unescape(metadata).partition("=")
+            metadata_file_hashes = {hash_name: hash_value} if sep else {}
+
+        links.append([url, requires_python, yanked_reason, metadata_file_hashes])
+    return links
+
+
+def _read_wheel_distribution(wheel_zip, name, location):
+    from pip._internal.utils.wheel import read_wheel_metadata_file, wheel_dist_info_dir
+
+    info_dir = wheel_dist_info_dir(wheel_zip, name)
+    metadata = read_wheel_metadata_file(wheel_zip, f"{info_dir}/METADATA")
+    return _make_metadata_distribution(metadata, name, location)
+
+
+def _make_metadata_distribution(metadata, name, location):
+    from pip._internal.utils.pkg_resources import DictMetadata
+    from pip._vendor.pkg_resources import DistInfoDistribution
+
+    return DistInfoDistribution(
+        location=location,
+        metadata=DictMetadata({"METADATA": metadata}),
+        project_name=name,
+    )
+
+
+# The repository of a dependencies worker process, see
+# PyPIRepository.prefetch_dependencies()
+_worker_repository = None
+
+
+def _init_dependencies_worker(
+    pip_args, finder_options, cache_dir, max_index_age, verbosity
+):
+    global _worker_repository
+    log.verbosity = verbosity
+    _worker_repository = PyPIRepository(
+        pip_args, cache_dir=cache_dir, max_index_age=max_index_age
+    )
+    _worker_repository._set_finder_options(finder_options)
+
+
+def _get_dependencies_in_worker(requirement):
+    from pip._internal.req.constructors import install_req_from_line
+
+    ireq = install_req_from_line(requirement)
+    with _worker_repository.freshen_build_caches():
+        dependencies = _worker_repository.get_dependencies(ireq)
+    return sorted(str(dependency.req) for dependency in dependencies)
+
+
+def stat_local_or_remote_file(link, session):
+    """
+    Return the size and the validator of a local or remote file, like
+    open_local_or_remote_file(), without reading it. A remote file is only
+    asked for its headers with a HEAD request.
+
+    :type link: pip.index.Link
+    :type session: requests.Session
+    :return: a (size, validator) tuple, whose items are None if unknown
+    """
+    from pip._internal.utils.urls import url_to_path
+
+    url = link.url_without_fragment
+
+    if link.is_file:
+        st = os.stat(url_to_path(url))
+        return st.st_size, str(st.st_mtime_ns)
+
+    headers = {"Accept-Encoding": "identity"}
+    response = session.head(url, headers=headers, allow_redirects=True)
+    if response.status_code != 200:
+        return None, None
+
+    try:
+        content_length = int(response.headers["content-length"])
+    except (ValueError, KeyError, TypeError):
+        content_length = None
+    return (
+        content_length,
+        response.headers.get("ETag") or response.headers.get("Last-Modified"),
+    )
+
+
 @contextmanager
 def open_local_or_remote_file(link, session):
     """
@@ -485,8 +1357,13 @@ def open_local_or_remote_file(link, session):
     :type link: pip.index.Link
     :type session: requests.Session
     :raises ValueError: If link points to a local directory.
-    :return: a context manager to a FileStream with the opened file-like object
+    :return: a context manager to a FileStream with the opened file-like object,
+        its size and a validator of its content (the ETag or Last-Modified
+        header of a remote file, the modification time of a local file), if
+        known
     """
+    from pip._internal.utils.urls import url_to_path
+
     url = link.url_without_fragment
 
     if link.is_file:
@@ -497,7 +1374,9 @@ def open_local_or_remote_file(link, session):
         else:
             st = os.stat(local_path)
             with open(local_path, "rb") as local_file:
-                yield FileStream(stream=local_file, size=st.st_size)
+                yield FileStream(
+                    stream=local_file, size=st.st_size, etag=str(st.st_mtime_ns)
+                )
     else:
         # Remote URL
         headers = {"Accept-Encoding": "identity"}
@@ -510,6 +1389,11 @@ def open_local_or_remote_file(link, session):
             content_length = None
 
         try:
-            yield FileStream(stream=response.raw, size=content_length)
+            yield FileStream(
+                stream=response.raw,
+                size=content_length,
+                etag=response.headers.get("ETag")
+                or response.headers.get("Last-Modified"),
+            )
         finally:
             response.close()
@@ -1,19 +1,22 @@
 import copy
+import time
+from collections import defaultdict
 from functools import partial
 from itertools import chain, count, groupby
 
 import click
-from pip._internal.req.constructors import install_req_from_line
-from pip._internal.req.req_tracker import update_env_context_manager
 
 from .logging import log
+from .repositories.local import ireq_satisfied_by_existing_pin
 from .utils import (
     UNSAFE_PACKAGES,
+    as_tuple,
     format_requirement,
     format_specifier,
     is_pinned_requirement,
     is_url_requirement,
     key_from_ireq,
+    make_install_requirement,
 )
 
 green = partial(click.style, fg="green")
@@ -60,8 +63,11 @@ def combine_install_requirements(repository, ireqs):
     if len(source_ireqs) == 1:
         return source_ireqs[0]
 
-    # deepcopy the accumulator so as to not modify the inputs
-    combined_ireq = copy.deepcopy(source_ireqs[0])
+    # Shallow copy the accumulator so as to not modify the inputs. Deep
+    # copies are expensive, and all we change is the requirement's specifier,
+    # the extras and the constraint flag, which are replaced, not modified.
+    combined_ireq = copy.copy(source_ireqs[0])
+    combined_ireq.req = copy.copy(source_ireqs[0].req)
     repository.copy_ireq_dependencies(source_ireqs[0], combined_ireq)
 
     for ireq in source_ireqs[1:]:
@@ -106,11 +112,15 @@ class Resolver:
         prereleases=False,
         clear_caches=False,
         allow_unsafe=False,
+        existing_pins=None,
     ):
         """
         This class resolves a given set of constraints (a collection of
         InstallRequirement objects) by consulting the given Repository and the
         DependencyCache.
+
+        The existing pins (a mapping of keys to pinned InstallRequirements, as
+        read from a previous output file) are used to resolve incrementally.
         """
         self.our_constraints = set(constraints)
         self.their_constraints = set()
@@ -119,8 +129,13 @@ class Resolver:
         self.prereleases = prereleases
         self.clear_caches = clear_caches
         self.allow_unsafe = allow_unsafe
+        self.existing_pins = existing_pins or {}
         self.unsafe_constraints = set()
 
+        # Statistics of the last resolve() call
+        self.round_count = 0
+        self.best_match_lookups = 0
+
     @property
     def constraints(self):
         return set(
@@ -134,7 +149,7 @@ class Resolver:
         log.debug("")
         log.debug("Generating hashes:")
         with self.repository.allow_all_wheels(), log.indentation():
-            return {ireq: self.repository.get_hashes(ireq) for ireq in ireqs}
+            return self.repository.get_all_hashes(ireqs)
 
     def resolve(self, max_rounds=10):
         """
@@ -146,39 +161,36 @@ class Resolver:
         anymore.  Protects against infinite loops by breaking out after a max
         number rounds.
         """
+        from pip._internal.req.req_tracker import update_env_context_manager
+
         if self.clear_caches:
             self.dependency_cache.clear()
             self.repository.clear_caches()
 
+        self._seed_from_existing_pins()
+
+        self.round_count = 0
+        self.best_match_lookups = 0
+        start_time = time.perf_counter()
+
         # Ignore existing packages
         with update_env_context_manager(PIP_EXISTS_ACTION="i"):
-            for current_round in count(start=1):  # pragma: no branch
-                if current_round > max_rounds:
-                    raise RuntimeError(
-                        "No stable configuration of concrete packages "
-                        "could be found for the given constraints after "
-                        "{max_rounds} rounds of resolving.\n"
-                        "This is likely a bug.".format(max_rounds=max_rounds)
-                    )
+            try:
+                best_matches = self._resolve_rounds(max_rounds)
+            finally:
+                # Persist whatever was learned, even if resolving failed
+                self.dependency_cache.flush()
 
-                log.debug("")
-                log.debug(magenta(f"{f'ROUND {current_round}':^60}"))
-                # If a package version (foo==2.0) was built in a previous round,
-                # and in this round a different version of foo needs to be built
-                # (i.e. foo==1.0), the directory will exist already, which will
-                # cause a pip build failure.  The trick is to start with a new
-                # build cache dir for every round, so this can never happen.
-                with self.repository.freshen_build_caches():
-                    has_changed, best_matches = self._resolve_one_round()
-                    log.debug("-" * 60)
-                    log.debug(
-                        "Result of round {}: {}".format(
-                            current_round,
-                            "not stable" if has_changed else "stable, done",
-                        )
-                    )
-                if not has_changed:
-                    break
+        log.debug("")
+        log.debug(
+            "Resolved {} packages in {} rounds with {} best match lookups "
+            "in {:.3f}s".format(
+                len(best_matches),
+                self.round_count,
+                self.best_match_lookups,
+                time.perf_counter() - start_time,
+            )
+        )
 
         # Only include hard requirements and not pip constraints
         results = {req for req in best_matches if not req.constraint}
@@ -202,6 +214,89 @@ class Resolver:
 
         return results
 
+    def _seed_from_existing_pins(self):
+        """
+        Starts from the dependencies of the existing pins, as far as they
+        still satisfy the constraints and their dependencies are cached.
+
+        Only the parts of the dependency graph below changed constraints are
+        cut off and have to be resolved again, so an unchanged set of
+        constraints is resolved in a single round.
+        """
+        from pip._internal.req.constructors import install_req_from_line
+
+        if not self.existing_pins:
+            return
+
+        seeded_constraints = []
+        seen = set()
+        pending = list(self.our_constraints)
+        while pending:
+            ireq = pending.pop()
+            if ireq.constraint or ireq.editable or is_url_requirement(ireq):
+                continue
+
+            existing_pin = self.existing_pins.get(key_from_ireq(ireq))
+            if not (
+                existing_pin and ireq_satisfied_by_existing_pin(ireq, existing_pin)
+            ):
+                continue
+
+            project, version, _ = as_tuple(existing_pin)
+            pin = make_install_requirement(project, version, ireq.extras)
+            pin.comes_from = ireq.comes_from
+            cache_key = self.dependency_cache.as_cache_key(pin)
+            if cache_key in seen or pin not in self.dependency_cache:
+                continue
+            seen.add(cache_key)
+
+            for dependency_string in self.dependency_cache[pin]:
+                dependency = install_req_from_line(dependency_string, comes_from=pin)
+                seeded_constraints.append(dependency)
+                pending.append(dependency)
+
+        self.their_constraints = set(self._group_constraints(seeded_constraints))
+        log.debug(
+            f"Starting from {len(self.their_constraints)} dependencies "
+            "of the existing pins"
+        )
+
+    def _resolve_rounds(self, max_rounds):
+        """
+        Resolves constraints one round at a time until they don't change
+        anymore, and returns the best matches of the last round.
+        """
+        for current_round in count(start=1):  # pragma: no branch
+            if current_round > max_rounds:
+                raise RuntimeError(
+                    "No stable configuration of concrete packages "
+                    "could be found for the given constraints after "
+                    "{max_rounds} rounds of resolving.\n"
+                    "This is likely a bug.".format(max_rounds=max_rounds)
+                )
+
+            self.round_count = current_round
+            log.debug("")
+            log.debug(magenta(f"{f'ROUND {current_round}':^60}"))
+            # If a package version (foo==2.0) was built in a previous round,
+            # and in this round a different version of foo needs to be built
+            # (i.e. foo==1.0), the directory will exist already, which will
+            # cause a pip build failure.  The trick is to start with a new
+            # build cache dir for every round, so this can never happen.
+            with self.repository.freshen_build_caches():
+                has_changed, best_matches = self._resolve_one_round()
+                log.debug("-" * 60)
+                log.debug(
+                    "Result of round {}: {}".format(
+                        current_round,
+                        "not stable" if has_changed else "stable, done",
+                    )
+                )
+            if not has_changed:
+                break
+
+        return best_matches
+
     def _group_constraints(self, constraints):
         """
         Groups constraints (remember, InstallRequirements!) by their key name,
@@ -254,11 +349,34 @@ class Resolver:
             for constraint in constraints:
                 log.debug(str(constraint))
 
+        # Fetch the candidates of everything that has to be looked up in the
+        # repository at once, instead of one package at a time below
+        self.repository.prefetch_candidates(
+            ireq
+            for ireq in constraints
+            if not (
+                ireq.editable
+                or is_url_requirement(ireq)
+                or is_pinned_requirement(ireq)
+                or ireq.constraint
+            )
+        )
+
         log.debug("")
         log.debug("Finding the best candidates:")
         with log.indentation():
             best_matches = {self.get_best_match(ireq) for ireq in constraints}
 
+        # Give the repository a chance to get the dependencies of all the
+        # uncached packages at once, instead of one package at a time below
+        self.repository.prefetch_dependencies(
+            ireq
+            for ireq in best_matches
+            if not ireq.constraint
+            and is_pinned_requirement(ireq)
+            and ireq not in self.dependency_cache
+        )
+
         # Find the new set of secondary dependencies
         log.debug("")
         log.debug("Finding secondary dependencies:")
@@ -310,6 +428,7 @@ class Resolver:
             Flask==0.10.1 => Flask==0.10.1
 
         """
+        self.best_match_lookups += 1
         if ireq.editable or is_url_requirement(ireq):
             # NOTE: it's much quicker to immediately return instead of
             # hitting the index server
@@ -347,6 +466,8 @@ class Resolver:
         Editable requirements will never be looked up, as they may have
         changed at any time.
         """
+        from pip._internal.req.constructors import install_req_from_line
+
         # Pip does not resolve dependencies of constraints. We skip handling
         # constraints here as well to prevent the cache from being polluted.
         # Constraints that are later determined to be dependencies will be
@@ -394,3 +515,221 @@ class Resolver:
             ireq for ireq in ireqs if not (ireq.editable or is_url_requirement(ireq))
         ]
         return self.dependency_cache.reverse_dependencies(non_editable)
+
+
+class WorklistResolver(Resolver):
+    """
+    Resolves the same constraints as the Resolver, but instead of repeating
+    full rounds over all constraints, it keeps a worklist of the packages
+    whose combined constraint may have changed. Only those packages get
+    their best match looked up again, and only packages whose best match
+    changed get their dependencies looked up again.
+
+    Every pass over the worklist is reported as a round. A package whose best
+    match changes more than `max_rounds` times aborts the resolution.
+    """
+
+    def _seed_from_existing_pins(self):
+        # Packages are looked at only as often as their constraints change,
+        # so there is nothing to gain from starting with the existing pins.
+        pass
+
+    def _resolve_rounds(self, max_rounds):
+        # Constraints by package key, the dependencies coming from each
+        # parent's best match by package key, the keys of the dependencies of
+        # each parent, and the current best matches
+        ours = {
+            key_from_ireq(ireq): ireq
+            for ireq in self._group_constraints(self.our_constraints)
+        }
+        theirs = defaultdict(dict)
+        children = defaultdict(set)
+        best_matches = {}
+        summaries = {}
+        update_counts = defaultdict(int)
+
+        dirty = set(ours)
+        while True:
+            # Packages which are only required by each other (e.g. after a
+            # new version dropped the dependency that pulled them in) would
+            # keep each other alive, so drop them before anything else.
+            orphans = _find_orphans(ours, children, best_matches)
+            for key in orphans:
+                log.debug(f"removing {key}")
+                del best_matches[key]
+                del summaries[key]
+            dirty |= self._update_dependencies(orphans, theirs, children, best_matches)
+            if not dirty:
+                break
+
+            self.round_count += 1
+            worklist = sorted(dirty)
+            dirty = set()
+
+            log.debug("")
+            log.debug(magenta(f"{f'ROUND {self.round_count}':^60}"))
+            with self.repository.freshen_build_caches():
+                changed = self._update_best_matches(
+                    worklist, ours, theirs, best_matches, summaries
+                )
+                for key in changed:
+                    update_counts[key] += 1
+                    if update_counts[key] > max_rounds:
+                        raise RuntimeError(
+                            "No stable configuration of concrete packages "
+                            "could be found for the given constraints after "
+                            "{max_rounds} updates of {key}.\n"
+                            "This is likely a bug.".format(
+                                max_rounds=max_rounds, key=key
+                            )
+                        )
+                dirty = self._update_dependencies(
+                    changed, theirs, children, best_matches
+                )
+                log.debug("-" * 60)
+                log.debug(
+                    "Result of round {}: {}".format(
+                        self.round_count,
+                        f"{len(dirty)} packages to revisit"
+                        if dirty
+                        else "stable, done",
+                    )
+                )
+
+        their_constraints = list(
+            chain.from_iterable(
+                dependencies
+                for parents in theirs.values()
+                for dependencies in parents.values()
+            )
+        )
+        self.their_constraints = set(self._group_constraints(their_constraints))
+
+        # Best matches are only looked up again when their constraint changes,
+        # so collect where they come from over all of their sources.
+        for constraint in self._group_constraints(
+            chain(ours.values(), their_constraints)
+        ):
+            best_match = best_matches[key_from_ireq(constraint)]
+            best_match.comes_from = constraint.comes_from
+            if hasattr(constraint, "_source_ireqs"):
+                best_match._source_ireqs = constraint._source_ireqs
+        return set(best_matches.values())
+
+    def _update_best_matches(self, worklist, ours, theirs, best_matches, summaries):
+        """
+        Looks up the best matches of the packages in the worklist whose
+        combined constraint changed, and returns the keys of the packages
+        whose best match changed (or which are no longer required at all).
+        """
+        constraints = {}
+        changed = []
+        for key in worklist:
+            sources = list(
+                chain(
+                    [ours[key]] if key in ours else [],
+                    chain.from_iterable(theirs[key].values()),
+                )
+            )
+            if not sources:
+                if key in best_matches:
+                    log.debug(f"removing {key}")
+                    del best_matches[key]
+                    del summaries[key]
+                    changed.append(key)
+                continue
+
+            (constraint,) = self._group_constraints(sources)
+            summary = RequirementSummary(constraint)
+            if (
+                key not in summaries
+                or summaries[key] != summary
+                or (best_matches[key].constraint != constraint.constraint)
+            ):
+                constraints[key] = constraint
+                summaries[key] = summary
+
+        self.repository.prefetch_candidates(
+            ireq
+            for ireq in constraints.values()
+            if not (
+                ireq.editable
+                or is_url_requirement(ireq)
+                or is_pinned_requirement(ireq)
+                or ireq.constraint
+            )
+        )
+
+        log.debug("Finding the best candidates:")
+        with log.indentation():
+            for key, constraint in constraints.items():
+                best_match = self.get_best_match(constraint)
+                previous_best_match = best_matches.get(key)
+                best_matches[key] = best_match
+                if previous_best_match is None or _identity(
+                    previous_best_match
+                ) != _identity(best_match):
+                    changed.append(key)
+        return changed
+
+    def _update_dependencies(self, changed, theirs, children, best_matches):
+        """
+        Updates the dependencies of the packages whose best match changed,
+        and returns the keys of the packages whose constraints changed as a
+        result. Only the previous and the new dependencies of those packages
+        are looked at.
+        """
+        updated = [best_matches[key] for key in changed if key in best_matches]
+        self.repository.prefetch_dependencies(
+            ireq
+            for ireq in updated
+            if not ireq.constraint
+            and is_pinned_requirement(ireq)
+            and ireq not in self.dependency_cache
+        )
+
+        dirty = set()
+        log.debug("")
+        log.debug("Finding secondary dependencies:")
+        with log.indentation():
+            for key in changed:
+                best_match = best_matches.get(key)
+                dependencies = defaultdict(list)
+                if best_match is not None:
+                    for dependency in self._iter_dependencies(best_match):
+                        dependencies[key_from_ireq(dependency)].append(dependency)
+
+                previous_child_keys = children.pop(key, set())
+                if dependencies:
+                    children[key] = set(dependencies)
+                for child_key in set(dependencies) | previous_child_keys:
+                    previous = theirs[child_key].pop(key, [])
+                    if child_key in dependencies:
+                        theirs[child_key][key] = dependencies[child_key]
+                    if {RequirementSummary(ireq) for ireq in previous} != {
+                        RequirementSummary(ireq) for ireq in dependencies[child_key]
+                    }:
+                        dirty.add(child_key)
+        return dirty
+
+
+def _identity(best_match):
+    """
+    What a best match stands for, regardless of where it comes from.
+    """
+    return format_requirement(best_match), best_match.constraint
+
+
+def _find_orphans(ours, children, best_matches):
+    """
+    Returns the keys of the best matches which can't be reached from our
+    constraints.
+    """
+    reachable = set()
+    worklist = [key for key in ours if key in best_matches]
+    while worklist:
+        key = worklist.pop()
+        if key not in reachable:
+            reachable.add(key)
+            worklist.extend(children.get(key, ()))
+    return sorted(set(best_matches) - reachable)
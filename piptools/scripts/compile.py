@@ -2,28 +2,44 @@ import os
 import shlex
 import sys
 import tempfile
+import time
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any
 
 import click
 from click import Command
 from click.utils import safecall
 from pip._internal.commands import create_command
-from pip._internal.req.constructors import install_req_from_line
-from pip._internal.utils.misc import redact_auth_from_url
 
 from .._compat import parse_requirements
-from ..cache import DependencyCache
+from ..cache import (
+    BaseDependencyCache,
+    BinaryDependencyCache,
+    DependencyCache,
+    RemoteDependencyCache,
+    SQLiteDependencyCache,
+)
+from ..daemon import serve as serve_requests
 from ..exceptions import PipToolsError
+from ..fingerprint import compute_fingerprint, read_fingerprint, write_fingerprint
 from ..locations import CACHE_DIR
 from ..logging import log
 from ..repositories import LocalRequirementsRepository, PyPIRepository
-from ..resolver import Resolver
+from ..repositories.pypi import RepositoryMemos
+from ..resolver import Resolver, WorklistResolver
 from ..utils import UNSAFE_PACKAGES, dedup, is_pinned_requirement, key_from_ireq
 from ..writer import OutputWriter
 
 DEFAULT_REQUIREMENTS_FILE = "requirements.in"
 DEFAULT_REQUIREMENTS_OUTPUT_FILE = "requirements.txt"
+# How long the daemon keeps the index pages it fetched, in seconds
+DEFAULT_SERVE_MAX_INDEX_AGE = 300
+DEPENDENCY_CACHE_BACKENDS = {
+    "json": DependencyCache,
+    "sqlite": SQLiteDependencyCache,
+    "binary": BinaryDependencyCache,
+}
 
 
 def _get_default_option(option_name: str) -> Any:
@@ -57,6 +73,43 @@ class BaseCommand(Command):
         return bool(self._os_args & args)
 
 
+def _get_index_url_help() -> str:
+    from pip._internal.utils.misc import redact_auth_from_url
+
+    return "Change index URL (defaults to {index_url})".format(
+        index_url=redact_auth_from_url(_get_default_option("index_url"))
+    )
+
+
+class LazyHelpOption(click.Option):
+    """
+    An option whose help text is computed by the ``lazy_help`` callable, only
+    when the help is shown.
+    """
+
+    def __init__(self, *args, lazy_help, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lazy_help = lazy_help
+
+    def get_help_record(self, ctx):
+        if self.help is None:
+            self.help = self._lazy_help()
+        return super().get_help_record(ctx)
+
+
+def _shared(ctx, key, factory):
+    """
+    Returns the object shared under the given key by the compilations of a
+    --batch run, creating it with factory() the first time. Outside of batch
+    runs, a new object is created each time.
+    """
+    if ctx.obj is None:
+        return factory()
+    if key not in ctx.obj:
+        ctx.obj[key] = factory()
+    return ctx.obj[key]
+
+
 @click.command(
     cls=BaseCommand, context_settings={"help_option_names": ("-h", "--help")}
 )
@@ -92,9 +145,9 @@ class BaseCommand(Command):
 @click.option(
     "-i",
     "--index-url",
-    help="Change index URL (defaults to {index_url})".format(
-        index_url=redact_auth_from_url(_get_default_option("index_url"))
-    ),
+    cls=LazyHelpOption,
+    # The default index URL is only looked up in the pip config for --help
+    lazy_help=_get_index_url_help,
 )
 @click.option(
     "--extra-index-url", multiple=True, help="Add additional index URL to search"
@@ -194,6 +247,24 @@ class BaseCommand(Command):
     default=10,
     help="Maximum number of rounds before resolving the requirements aborts.",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of processes used to get the dependencies of uncached packages.",
+)
+@click.option(
+    "--resolver",
+    "resolver_name",
+    default="rounds",
+    type=click.Choice(["rounds", "worklist"]),
+    show_default=True,
+    help=(
+        "Resolve in full rounds over all constraints, or only revisit the "
+        "packages whose constraints changed."
+    ),
+)
 @click.argument("src_files", nargs=-1, type=click.Path(exists=True, allow_dash=True))
 @click.option(
     "--build-isolation/--no-build-isolation",
@@ -216,6 +287,99 @@ class BaseCommand(Command):
     show_default=True,
     type=click.Path(file_okay=False, writable=True),
 )
+@click.option(
+    "--cache-backend",
+    default="json",
+    type=click.Choice(list(DEPENDENCY_CACHE_BACKENDS)),
+    show_default=True,
+    help=(
+        "Store the dependency cache in a JSON file, in an SQLite database "
+        "that several pip-compile processes can share, or in a compact binary "
+        "file that is read only as far as needed."
+    ),
+)
+@click.option(
+    "--cache-max-entries",
+    type=click.IntRange(min=0),
+    metavar="N",
+    help="Remove the least recently used entries beyond N from the dependency cache.",
+)
+@click.option(
+    "--cache-max-age",
+    type=click.IntRange(min=0),
+    metavar="DAYS",
+    help="Remove the entries unused for DAYS days from the dependency cache.",
+)
+@click.option(
+    "--cache-prune",
+    is_flag=True,
+    default=False,
+    help=(
+        "Only remove the entries beyond --cache-max-entries or --cache-max-age "
+        "from the dependency cache, and compact it."
+    ),
+)
+@click.option(
+    "--remote-cache",
+    metavar="URL",
+    help=(
+        "Share the dependency cache with other machines through GET and PUT "
+        "requests below URL. Index pages and hashes are always read from the "
+        "indexes."
+    ),
+)
+@click.option(
+    "--max-index-age",
+    default=0,
+    type=click.IntRange(min=0),
+    metavar="SECONDS",
+    help=(
+        "Reuse the cached index pages of packages for up to SECONDS seconds "
+        "without checking the index for changes."
+    ),
+)
+@click.option(
+    "--skip-unchanged",
+    is_flag=True,
+    default=False,
+    help=(
+        "Exit without resolving when the options, the input files and the "
+        "output file are unchanged since the last compilation."
+    ),
+)
+@click.option(
+    "--batch",
+    type=click.Path(exists=True, dir_okay=False),
+    metavar="MANIFEST",
+    help=(
+        "Run the pip-compile command lines listed in MANIFEST, one per line, in "
+        "a single process sharing the fetched index pages and the caches. The "
+        "options given on the command line apply to every line."
+    ),
+)
+@click.option(
+    "--batch-jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help=(
+        "Number of processes running the compilations of --batch in parallel. "
+        "Use --cache-backend sqlite for them to share the dependency cache."
+    ),
+)
+@click.option(
+    "--serve",
+    metavar="SOCKET",
+    type=click.Path(dir_okay=False),
+    help=(
+        "Run a daemon compiling the requests of pip-compile-client on the Unix "
+        "socket SOCKET, keeping the fetched index pages for up to "
+        "--max-index-age seconds (default: "
+        f"{DEFAULT_SERVE_MAX_INDEX_AGE}) and the dependency cache open. The "
+        "dependency cache defaults to the sqlite backend, the other backends "
+        "are read again for each request. The options given on the command "
+        "line apply to every request."
+    ),
+)
 @click.option("--pip-args", help="Arguments to pass directly to the pip command.")
 @click.option(
     "--emit-index-url/--no-emit-index-url",
@@ -248,15 +412,65 @@ def cli(
     reuse_hashes,
     src_files,
     max_rounds,
+    jobs,
+    resolver_name,
     build_isolation,
     emit_find_links,
     cache_dir,
+    cache_backend,
+    cache_max_entries,
+    cache_max_age,
+    cache_prune,
+    remote_cache,
+    max_index_age,
+    skip_unchanged,
+    batch,
+    batch_jobs,
+    serve,
     pip_args,
     emit_index_url,
 ):
     """Compiles requirements.txt from requirements.in specs."""
     log.verbosity = verbose - quiet
 
+    cache_class = DEPENDENCY_CACHE_BACKENDS[cache_backend]
+    cache_max_age = None if cache_max_age is None else cache_max_age * 24 * 60 * 60
+    if cache_prune:
+        if cache_max_entries is None and cache_max_age is None:
+            raise click.BadParameter(
+                "--cache-prune requires --cache-max-entries or --cache-max-age"
+            )
+        removed = cache_class(cache_dir).prune(
+            max_entries=cache_max_entries, max_age=cache_max_age
+        )
+        log.info(f"Removed {removed} entries from the dependency cache")
+        return
+
+    if (batch or serve) and ctx.obj is not None:
+        raise click.BadParameter(
+            "--batch and --serve can't be used in a batch or a daemon request"
+        )
+
+    if batch:
+        if src_files or output_file:
+            raise click.BadParameter(
+                "--batch can't be combined with input files or --output-file"
+            )
+        sys.exit(_compile_batch(ctx, batch, batch_jobs))
+
+    if serve:
+        if src_files or output_file:
+            raise click.BadParameter(
+                "--serve can't be combined with input files or --output-file"
+            )
+        if not cli.has_arg("max_index_age"):
+            max_index_age = DEFAULT_SERVE_MAX_INDEX_AGE
+        if not cli.has_arg("cache_backend"):
+            # Other pip-compile processes may write to it while the daemon runs
+            cache_backend = "sqlite"
+        _serve(ctx, serve, max_index_age, cache_backend)
+        return
+
     if len(src_files) == 0:
         if os.path.exists(DEFAULT_REQUIREMENTS_FILE):
             src_files = (DEFAULT_REQUIREMENTS_FILE,)
@@ -305,10 +519,26 @@ def cli(
         )
         emit_index_url = index
 
+    # Only keep the existing output file if nothing it depends on changed,
+    # one-off options asking for a new resolution always resolve
+    fingerprint_enabled = skip_unchanged and not (
+        dry_run or upgrade or upgrade_packages or rebuild
+    )
+    if fingerprint_enabled:
+        fingerprint = compute_fingerprint(ctx, src_files, output_file.name)
+        if fingerprint is not None and fingerprint == read_fingerprint(
+            cache_dir, output_file.name
+        ):
+            log.info(f"{output_file.name} is up to date, nothing updated.")
+            return
+
     ###
     # Setup
     ###
 
+    from pip._internal.req.constructors import install_req_from_line
+    from pip._internal.utils.misc import redact_auth_from_url
+
     right_args = shlex.split(pip_args or "")
     pip_args = []
     for link in find_links:
@@ -330,7 +560,16 @@ def cli(
         pip_args.append("--no-build-isolation")
     pip_args.extend(right_args)
 
-    repository = PyPIRepository(pip_args, cache_dir=cache_dir)
+    # The options in the input files change the finder and options of the
+    # repository, so each compilation of a batch has its own repository, only
+    # the documents it fetched are shared
+    repository = PyPIRepository(
+        pip_args,
+        cache_dir=cache_dir,
+        jobs=jobs,
+        max_index_age=max_index_age,
+        memos=_shared(ctx, ("repository_memos",), RepositoryMemos),
+    )
 
     # Parse all constraints coming from --upgrade-package/-P
     upgrade_reqs_gen = (install_req_from_line(pkg) for pkg in upgrade_packages)
@@ -338,24 +577,19 @@ def cli(
         key_from_ireq(install_req): install_req for install_req in upgrade_reqs_gen
     }
 
+    existing_pins = {}
     existing_pins_to_upgrade = set()
 
     # Proxy with a LocalRequirementsRepository if --upgrade is not specified
     # (= default invocation)
     if not upgrade and os.path.exists(output_file.name):
-        # Use a temporary repository to ensure outdated(removed) options from
-        # existing requirements.txt wouldn't get into the current repository.
-        tmp_repository = PyPIRepository(pip_args, cache_dir=cache_dir)
-        ireqs = parse_requirements(
-            output_file.name,
-            finder=tmp_repository.finder,
-            session=tmp_repository.session,
-            options=tmp_repository.options,
-        )
+        # Parse without the finder and options of the repository, so outdated
+        # (removed) options from the existing requirements.txt don't get into
+        # the current repository. Only the pins are needed from the file.
+        ireqs = parse_requirements(output_file.name, session=repository.session)
 
         # Exclude packages from --upgrade-package/-P from the existing
         # constraints, and separately gather pins to be upgraded
-        existing_pins = {}
         for ireq in filter(is_pinned_requirement, ireqs):
             key = key_from_ireq(ireq)
             if key in upgrade_install_reqs:
@@ -437,19 +671,39 @@ def cli(
                 log.debug(redact_auth_from_url(find_link))
 
     try:
-        resolver = Resolver(
+        resolver_class = {"rounds": Resolver, "worklist": WorklistResolver}[
+            resolver_name
+        ]
+
+        def make_dependency_cache():
+            dependency_cache = cache_class(cache_dir)
+            if remote_cache:
+                dependency_cache = RemoteDependencyCache(
+                    dependency_cache, remote_cache, repository.session
+                )
+            return dependency_cache
+
+        dependency_cache = _shared(
+            ctx,
+            ("dependency_cache", cache_backend, cache_dir, remote_cache),
+            make_dependency_cache,
+        )
+        resolver = resolver_class(
             constraints,
             repository,
             prereleases=repository.finder.allow_all_prereleases or pre,
-            cache=DependencyCache(cache_dir),
+            cache=dependency_cache,
             clear_caches=rebuild,
             allow_unsafe=allow_unsafe,
+            existing_pins=existing_pins,
         )
         results = resolver.resolve(max_rounds=max_rounds)
         if generate_hashes:
             hashes = resolver.resolve_hashes(results)
         else:
             hashes = None
+        if cache_max_entries is not None or cache_max_age is not None:
+            dependency_cache.prune(max_entries=cache_max_entries, max_age=cache_max_age)
     except PipToolsError as e:
         log.error(str(e))
         sys.exit(2)
@@ -488,3 +742,180 @@ def cli(
 
     if dry_run:
         log.info("Dry-run, so nothing updated.")
+    elif fingerprint_enabled:
+        # The fingerprint covers the new content of the output file
+        output_file.close_intelligently()
+        fingerprint = compute_fingerprint(ctx, src_files, output_file.name)
+        if fingerprint is not None:
+            write_fingerprint(cache_dir, output_file.name, fingerprint)
+
+
+# Options which only make sense for the command line running the batch or
+# the daemon
+_BATCH_OPTIONS = {
+    "batch",
+    "batch_jobs",
+    "cache_prune",
+    "output_file",
+    "serve",
+    "src_files",
+}
+
+
+def _get_batch_default_map(ctx):
+    """
+    Returns the options of the current command line which differ from their
+    default, as defaults for the compilations of a batch or daemon.
+    """
+    params = {param.name: param for param in cli.params}
+    return {
+        name: value
+        for name, value in ctx.params.items()
+        if name not in _BATCH_OPTIONS and value != params[name].default
+    }
+
+
+def _read_batch_file(path):
+    """
+    Returns the arguments of each pip-compile command line listed in the batch
+    file. Blank lines and comments are skipped, and the leading pip-compile is
+    optional.
+    """
+    entries = []
+    with open(path) as batch_file:
+        for line in batch_file:
+            args = shlex.split(line, comments=True)
+            if not args:
+                continue
+            if args[0] == "pip-compile":
+                args = args[1:]
+            entries.append(args)
+    return entries
+
+
+def _compile_batch(ctx, batch_file, batch_jobs):
+    """
+    Runs the compilations listed in the batch file, with the options of the
+    current command line as defaults, and returns the highest exit code.
+    """
+    default_map = _get_batch_default_map(ctx)
+    entries = _read_batch_file(batch_file)
+
+    if batch_jobs == 1 or len(entries) < 2:
+        shared = {}
+        exit_codes = [
+            _compile_batch_entry(args, default_map, shared) for args in entries
+        ]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(len(entries), batch_jobs), initializer=_init_batch_worker
+        ) as executor:
+            exit_codes = list(
+                executor.map(
+                    _compile_batch_entry_in_worker,
+                    entries,
+                    [default_map] * len(entries),
+                )
+            )
+
+    for args, exit_code in zip(entries, exit_codes):
+        if exit_code:
+            command = " ".join(shlex.quote(arg) for arg in ["pip-compile", *args])
+            log.error(f"Failed to compile: {command}")
+    return max(exit_codes, default=0)
+
+
+def _compile_batch_entry(args, default_map, shared):
+    """
+    Runs a compilation of a --batch run with the fetched documents and caches
+    in shared, and returns its exit code.
+    """
+    try:
+        cli.main(
+            args,
+            prog_name="pip-compile",
+            obj=shared,
+            default_map=default_map,
+            standalone_mode=False,
+        )
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        return 1
+    finally:
+        # Worker processes don't run the atexit handlers saving the caches
+        for value in shared.values():
+            if isinstance(value, BaseDependencyCache):
+                value.flush()
+    return 0
+
+
+def _serve(ctx, socket_path, max_index_age, cache_backend):
+    """
+    Compiles the requests of pip-compile-client received on the socket, with
+    the options of the current command line as defaults.
+
+    The compilations of requests with the same PIP_* environment variables
+    share the fetched documents and caches. Unlike the dependencies of a
+    package version, index pages go stale, so the fetched documents are only
+    kept for up to max_index_age seconds, like the cached index pages.
+
+    Only the SQLite dependency cache is kept between requests. The others are
+    read once and written as a whole, which would drop the entries other
+    processes wrote in the meantime.
+    """
+    default_map = _get_batch_default_map(ctx)
+    default_map["max_index_age"] = max_index_age
+    default_map["cache_backend"] = cache_backend
+    shared_by_environ = {}
+    repositories_expiry = {}
+
+    def handle_request(args):
+        environ = tuple(
+            sorted(item for item in os.environ.items() if item[0].startswith("PIP_"))
+        )
+        shared = shared_by_environ.setdefault(environ, {})
+        now = time.monotonic()
+        if now >= repositories_expiry.get(environ, now):
+            for key in [key for key in shared if key[0] == "repository_memos"]:
+                del shared[key]
+            repositories_expiry[environ] = now + max_index_age
+
+        # Like the standard streams, the log goes to the client
+        log_stream, log.stream = log.stream, sys.stderr
+        try:
+            return _compile_batch_entry(args, default_map, shared)
+        finally:
+            log.stream = log_stream
+            for key in [
+                key
+                for key in shared
+                if key[0] == "dependency_cache" and key[1] != "sqlite"
+            ]:
+                del shared[key]
+
+    log.info(f"Serving pip-compile requests on {socket_path}")
+    try:
+        serve_requests(socket_path, handle_request)
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        log.error(str(e))
+        sys.exit(2)
+
+
+# The fetched documents and caches shared by the compilations of a batch worker
+# process, see _compile_batch()
+_worker_shared = None
+
+
+def _init_batch_worker():
+    global _worker_shared
+    _worker_shared = {}
+
+
+def _compile_batch_entry_in_worker(args, default_map):
+    return _compile_batch_entry(args, default_map, _worker_shared)
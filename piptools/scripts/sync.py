@@ -5,7 +5,6 @@ import sys
 
 import click
 from pip._internal.commands import create_command
-from pip._internal.utils.misc import get_installed_distributions
 
 from .. import sync
 from .._compat import parse_requirements
@@ -83,6 +82,8 @@ def cli(
     pip_args,
 ):
     """Synchronize virtual environment with requirements.txt."""
+    from pip._internal.utils.misc import get_installed_distributions
+
     log.verbosity = verbose - quiet
 
     if not src_files:
@@ -5,8 +5,6 @@ import tempfile
 from subprocess import run  # nosec
 
 import click
-from pip._internal.commands.freeze import DEV_PKGS
-from pip._internal.utils.compat import stdlib_pkgs
 
 from .exceptions import IncompatibleRequirements
 from .logging import log
@@ -25,8 +23,6 @@ PACKAGES_TO_IGNORE = [
     "pip-tools",
     "pip-review",
     "pkg-resources",
-    *stdlib_pkgs,
-    *DEV_PKGS,
 ]
 
 
@@ -74,9 +70,15 @@ def get_dists_to_ignore(installed):
     locally, click should also be installed/uninstalled depending on the given
     requirements.
     """
+    from pip._internal.commands.freeze import DEV_PKGS
+    from pip._internal.utils.compat import stdlib_pkgs
+
     installed_keys = {key_from_req(r): r for r in installed}
     return list(
-        flat_map(lambda req: dependency_tree(installed_keys, req), PACKAGES_TO_IGNORE)
+        flat_map(
+            lambda req: dependency_tree(installed_keys, req),
+            [*PACKAGES_TO_IGNORE, *stdlib_pkgs, *DEV_PKGS],
+        )
     )
 
 
@@ -4,9 +4,6 @@ from itertools import chain
 
 from click import style
 from click.utils import LazyFile
-from pip._internal.req.constructors import install_req_from_line
-from pip._internal.utils.misc import redact_auth_from_url
-from pip._internal.vcs import is_url
 
 UNSAFE_PACKAGES = {"setuptools", "distribute", "pip"}
 COMPILE_EXCLUDE_OPTIONS = {
@@ -17,7 +14,19 @@ COMPILE_EXCLUDE_OPTIONS = {
     "--upgrade-package",
     "--verbose",
     "--cache-dir",
+    "--cache-backend",
+    "--cache-max-entries",
+    "--cache-max-age",
+    "--cache-prune",
+    "--remote-cache",
     "--no-reuse-hashes",
+    "--jobs",
+    "--resolver",
+    "--max-index-age",
+    "--skip-unchanged",
+    "--batch",
+    "--batch-jobs",
+    "--serve",
 }
 
 
@@ -48,6 +57,8 @@ def comment(text: str) -> str:
 
 def make_install_requirement(name, version, extras, constraint=False):
     # If no extras are specified, the extras string is blank
+    from pip._internal.req.constructors import install_req_from_line
+
     extras_string = ""
     if extras:
         # Sort extras for stability
@@ -264,6 +275,9 @@ def get_compile_command(click_ctx):
         - removing one-off arguments like '--upgrade'
         - removing arguments that don't change build behaviour like '--verbose'
     """
+    from pip._internal.utils.misc import redact_auth_from_url
+    from pip._internal.vcs import is_url
+
     from piptools.scripts.compile import cli
 
     # Map of the compile cli options (option name -> click.Option)
@@ -20,7 +20,7 @@ from piptools.cache import DependencyCache
 from piptools.exceptions import NoCandidateFound
 from piptools.repositories import PyPIRepository
 from piptools.repositories.base import BaseRepository
-from piptools.resolver import Resolver
+from piptools.resolver import Resolver, WorklistResolver
 from piptools.utils import (
     as_tuple,
     is_url_requirement,
@@ -152,6 +152,11 @@ def resolver(depcache, repository):
     return partial(Resolver, repository=repository, cache=depcache)
 
 
+@pytest.fixture
+def worklist_resolver(depcache, repository):
+    return partial(WorklistResolver, repository=repository, cache=depcache)
+
+
 @pytest.fixture
 def base_resolver(depcache):
     return partial(Resolver, cache=depcache)
@@ -1,12 +1,30 @@
+import json
 import os
+import sqlite3
 import sys
+import time
 from contextlib import contextmanager
 from shutil import rmtree
 from tempfile import NamedTemporaryFile
+from unittest import mock
 
 import pytest
+from pip._vendor import requests
 
-from piptools.cache import CorruptCacheError, DependencyCache, read_cache_file
+from piptools.cache import (
+    BinaryCacheFile,
+    BinaryDependencyCache,
+    CorruptCacheError,
+    DependencyCache,
+    DependencyEdge,
+    FileCache,
+    RemoteCache,
+    RemoteDependencyCache,
+    SQLiteDependencyCache,
+    parse_dependency_edge,
+    read_cache_file,
+    write_binary_cache_file,
+)
 
 
 @contextmanager
@@ -119,3 +137,398 @@ def test_reverse_dependencies(from_line, tmpdir):
 
     # Clean up our temp directory
     rmtree(tmpdir)
+
+
+def test_dependency_edges(from_line, tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir)
+    cache[from_line("top==1.2")] = [
+        "Middle_Package[speedups]>=0.3",
+        "bottom<6; python_version < '4'",
+    ]
+
+    assert cache.dependency_edges(from_line("top==1.2")) == [
+        DependencyEdge(
+            key="middle-package",
+            specifier=">=0.3",
+            markers=None,
+            extras=frozenset({"speedups"}),
+        ),
+        DependencyEdge(
+            key="bottom",
+            specifier="<6",
+            markers='python_version < "4"',
+            extras=frozenset(),
+        ),
+    ]
+    with pytest.raises(KeyError):
+        cache.dependency_edges(from_line("top==1.3"))
+
+
+def test_dependency_edges_are_parsed_once(from_line, tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir)
+    with mock.patch(
+        "piptools.cache.parse_dependency_edge", wraps=parse_dependency_edge
+    ) as parse:
+        cache[from_line("top==1.2")] = ["middle>=0.3"]
+        cache[from_line("top==1.3")] = ["middle>=0.3"]
+        cache.reverse_dependencies([from_line("top==1.2"), from_line("top==1.3")])
+    parse.assert_called_once_with("middle>=0.3")
+
+
+def test_reverse_dependencies_of_changed_entries(from_line, tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir)
+    cache[from_line("top==1.2")] = ["middle>=0.3"]
+    cache[from_line("middle==0.4")] = []
+    ireqs = [from_line("top==1.2"), from_line("middle==0.4")]
+    assert cache.reverse_dependencies(ireqs) == {"middle": {"top"}}
+
+    cache[from_line("top==1.2")] = []
+    assert cache.reverse_dependencies(ireqs) == {}
+
+
+def test_write_cache_is_deferred(from_line, tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir, flush_threshold=3)
+    cache[from_line("top==1.2")] = ["middle>=0.3"]
+    cache[from_line("middle==0.4")] = []
+    assert not os.path.exists(cache._cache_file)
+
+    cache[from_line("bottom==5.3.5")] = []
+    assert read_cache_file(cache._cache_file) == {
+        "top": {"1.2": ["middle>=0.3"]},
+        "middle": {"0.4": []},
+        "bottom": {"5.3.5": []},
+    }
+
+
+def test_write_cache_on_flush_interval(from_line, tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir, flush_interval=0)
+    cache[from_line("top==1.2")] = []
+    assert read_cache_file(cache._cache_file) == {"top": {"1.2": []}}
+
+
+def test_flush(from_line, tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir)
+    cache.flush()
+    assert not os.path.exists(cache._cache_file)
+
+    cache[from_line("top==1.2")] = []
+    cache.flush()
+    assert read_cache_file(cache._cache_file) == {"top": {"1.2": []}}
+
+
+def test_write_cache_replaces_file_atomically(from_line, tmpdir):
+    cache = DependencyCache(cache_dir=tmpdir)
+    cache[from_line("top==1.2")] = []
+    cache.write_cache()
+    cache[from_line("top==1.3")] = []
+    cache.write_cache()
+
+    assert os.listdir(tmpdir) == [os.path.basename(cache._cache_file)]
+    assert read_cache_file(cache._cache_file) == {"top": {"1.2": [], "1.3": []}}
+
+
+def test_sqlite_dependency_cache(from_line, tmpdir):
+    cache = SQLiteDependencyCache(cache_dir=tmpdir)
+    assert from_line("top==1.2") not in cache
+    with pytest.raises(KeyError):
+        cache[from_line("top==1.2")]
+
+    cache[from_line("top==1.2")] = ["middle>=0.3"]
+    cache[from_line("top[xtra]==1.2")] = ["middle>=0.3", "bonus==0.4"]
+    assert cache[from_line("top==1.2")] == ["middle>=0.3"]
+
+    # Entries are visible to other connections right away, without flushing
+    other_cache = SQLiteDependencyCache(cache_dir=tmpdir)
+    assert other_cache[from_line("top[xtra]==1.2")] == ["middle>=0.3", "bonus==0.4"]
+    other_cache[from_line("middle==0.4")] = []
+    assert from_line("middle==0.4") in cache
+    assert cache.connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+
+    cache.clear()
+    assert from_line("top==1.2") not in other_cache
+
+
+def test_sqlite_dependency_cache_imports_json_cache(from_line, tmpdir):
+    json_cache = DependencyCache(cache_dir=tmpdir)
+    json_cache[from_line("top==1.2")] = ["middle>=0.3"]
+    json_cache[from_line("middle==0.4")] = []
+    json_cache.flush()
+
+    cache = SQLiteDependencyCache(cache_dir=tmpdir)
+    assert cache[from_line("top==1.2")] == ["middle>=0.3"]
+    assert cache.reverse_dependencies(
+        [from_line("top==1.2"), from_line("middle==0.4")]
+    ) == {"middle": {"top"}}
+
+    # The JSON cache is only imported once
+    cache.clear()
+    assert from_line("top==1.2") not in SQLiteDependencyCache(cache_dir=tmpdir)
+
+
+def test_sqlite_dependency_cache_corrupt_database(from_line, tmpdir):
+    cache = SQLiteDependencyCache(cache_dir=tmpdir)
+    with open(cache._db_file, "w") as f:
+        f.write("not a database" * 100)
+
+    with pytest.raises(CorruptCacheError):
+        from_line("top==1.2") in cache
+
+
+def test_binary_cache_file(tmpdir):
+    dependencies = {
+        "top": {"1.2": ["middle>=0.3"], "1.2[xtra]": ["middle>=0.3", "bonus==0.4"]},
+        "middle": {"0.4": []},
+        "bonus": {"0.4": []},
+        "änderung": {"1.0": ["middle>=0.3"]},
+    }
+    last_used = {"top": {"1.2": 1600000000}}
+    path = str(tmpdir / "depcache.bin")
+    write_binary_cache_file(path, dependencies, last_used)
+
+    cache_file = BinaryCacheFile(path)
+    assert sorted(cache_file.names()) == sorted(dependencies)
+    for name, versions in dependencies.items():
+        assert cache_file.get_package(name)[0] == versions
+    assert cache_file.get_package("top")[1] == {"1.2": 1600000000, "1.2[xtra]": 0}
+    assert cache_file.get_package("missing") is None
+    assert cache_file.get_package("zzz") is None
+    cache_file.close()
+
+
+@pytest.mark.parametrize("content", (b"", b"not a binary cache file"))
+def test_binary_cache_file_corrupt(tmpdir, content):
+    path = str(tmpdir / "depcache.bin")
+    with open(path, "wb") as f:
+        f.write(content)
+
+    with pytest.raises(CorruptCacheError):
+        BinaryCacheFile(path)
+
+
+def test_binary_dependency_cache(from_line, tmpdir):
+    cache = BinaryDependencyCache(cache_dir=tmpdir)
+    cache[from_line("top==1.2")] = ["middle>=0.3"]
+    cache[from_line("middle==0.4")] = []
+    cache.flush()
+    assert os.path.exists(cache._cache_file)
+
+    other_cache = BinaryDependencyCache(cache_dir=tmpdir)
+    assert other_cache[from_line("top==1.2")] == ["middle>=0.3"]
+    # Only the looked up packages are decoded
+    assert list(other_cache.cache) == ["top"]
+
+    # Adding a version keeps the other versions of the package
+    other_cache[from_line("top==1.3")] = []
+    other_cache.flush()
+    assert read_binary_cache(other_cache._cache_file) == {
+        "middle": {"0.4": []},
+        "top": {"1.2": ["middle>=0.3"], "1.3": []},
+    }
+
+    other_cache.clear()
+    assert read_binary_cache(other_cache._cache_file) == {}
+
+
+def test_binary_dependency_cache_imports_json_cache(from_line, tmpdir):
+    json_cache = DependencyCache(cache_dir=tmpdir)
+    json_cache[from_line("top==1.2")] = ["middle>=0.3"]
+    json_cache.flush()
+
+    cache = BinaryDependencyCache(cache_dir=tmpdir)
+    assert cache[from_line("top==1.2")] == ["middle>=0.3"]
+    cache[from_line("middle==0.4")] = []
+    cache.flush()
+    assert read_binary_cache(cache._cache_file) == {
+        "middle": {"0.4": []},
+        "top": {"1.2": ["middle>=0.3"]},
+    }
+
+
+def read_binary_cache(path):
+    cache_file = BinaryCacheFile(path)
+    try:
+        return {name: cache_file.get_package(name)[0] for name in cache_file.names()}
+    finally:
+        cache_file.close()
+
+
+@pytest.mark.parametrize(
+    "cache_class", (DependencyCache, BinaryDependencyCache, SQLiteDependencyCache)
+)
+def test_prune_dependency_cache(from_line, tmpdir, monkeypatch, cache_class):
+    day = 24 * 60 * 60
+    now = 1600000000
+
+    cache = cache_class(cache_dir=tmpdir)
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache[from_line("old==1.0")] = []
+    cache[from_line("used==1.0")] = []
+    monkeypatch.setattr(time, "time", lambda: now + day)
+    cache[from_line("new==1.0")] = []
+    monkeypatch.setattr(time, "time", lambda: now + 2 * day)
+    assert from_line("used==1.0") in cache
+    cache.flush()
+
+    monkeypatch.setattr(time, "time", lambda: now + 3 * day)
+    cache = cache_class(cache_dir=tmpdir)
+    assert cache.prune() == 0
+    assert cache.prune(max_entries=2) == 1
+    assert from_line("old==1.0") not in cache_class(cache_dir=tmpdir)
+
+    assert cache.prune(max_age=1.5 * day) == 1
+    cache = cache_class(cache_dir=tmpdir)
+    assert from_line("new==1.0") not in cache
+    assert from_line("used==1.0") in cache
+
+
+def test_json_cache_file_without_last_used(from_line, tmpdir, monkeypatch):
+    day = 24 * 60 * 60
+    cache = DependencyCache(cache_dir=tmpdir)
+    with open(cache._cache_file, "w") as f:
+        json.dump({"__format__": 1, "dependencies": {"top": {"1.2": []}}}, f)
+    os.utime(cache._cache_file, (1600000000, 1600000000))
+
+    # The entries count as used when the file was written
+    monkeypatch.setattr(time, "time", lambda: 1600000000 + day)
+    assert cache.prune(max_age=2 * day) == 0
+    assert cache.prune(max_age=day / 2) == 1
+
+    with open(cache._cache_file, "w") as f:
+        json.dump({"__format__": 1, "dependencies": {"oldpkg": {"1.2": []}}}, f)
+    os.utime(cache._cache_file, (1600000000, 1600000000))
+
+    # Writing the file doesn't make its old entries recently used
+    monkeypatch.setattr(time, "time", lambda: 1600000000 + 700 * day)
+    cache = DependencyCache(cache_dir=tmpdir)
+    cache[from_line("newpkg==1.0")] = []
+    cache.flush()
+    cache = DependencyCache(cache_dir=tmpdir)
+    assert cache.prune(max_age=30 * day) == 1
+    assert from_line("oldpkg==1.2") not in cache
+    assert from_line("newpkg==1.0") in cache
+
+
+def test_sqlite_dependency_cache_adds_last_used(from_line, tmpdir):
+    cache = SQLiteDependencyCache(cache_dir=tmpdir)
+    connection = sqlite3.connect(cache._db_file)
+    connection.execute(
+        "CREATE TABLE dependencies (name TEXT NOT NULL,"
+        " version_and_extras TEXT NOT NULL, dependencies TEXT NOT NULL,"
+        " PRIMARY KEY (name, version_and_extras)) WITHOUT ROWID"
+    )
+    connection.execute("INSERT INTO dependencies VALUES ('top', '1.2', '[]')")
+    connection.execute("PRAGMA user_version = 1")
+    connection.commit()
+    connection.close()
+
+    assert cache[from_line("top==1.2")] == []
+    assert cache.prune(max_age=24 * 60 * 60) == 0
+    assert cache.prune(max_entries=0) == 1
+
+
+def test_file_cache(tmpdir):
+    cache = FileCache(tmpdir, "test")
+    assert cache.get("https://example.com/simple/foo/") is None
+
+    cache.set("https://example.com/simple/foo/", {"links": ["foo-1.0.tar.gz"]})
+    assert cache.get("https://example.com/simple/foo/") == {"links": ["foo-1.0.tar.gz"]}
+    assert FileCache(tmpdir, "test").get("https://example.com/simple/foo/") == {
+        "links": ["foo-1.0.tar.gz"]
+    }
+
+    cache.clear()
+    assert cache.get("https://example.com/simple/foo/") is None
+
+
+def test_file_cache_ignores_corrupt_entries(tmpdir):
+    cache = FileCache(tmpdir, "test")
+    cache.set("foo", "bar")
+    with open(cache._path("foo"), "w") as f:
+        f.write("{")
+
+    assert cache.get("foo") is None
+
+
+def test_file_cache_prunes_least_recently_used_entries(tmpdir):
+    cache = FileCache(tmpdir, "test")
+    for i, key in enumerate(("old", "used", "new")):
+        cache.set(key, "x" * 100)
+        os.utime(cache._path(key), (i, i))
+    cache.get("used")
+
+    pruned_cache = FileCache(tmpdir, "test", max_size=300)
+    pruned_cache.set("newest", "x" * 100)
+
+    assert pruned_cache.get("old") is None
+    assert pruned_cache.get("new") == "x" * 100
+    assert pruned_cache.get("used") == "x" * 100
+    assert pruned_cache.get("newest") == "x" * 100
+
+
+class FakeCacheServer:
+    """A session storing the bodies of PUT requests, and serving them."""
+
+    def __init__(self):
+        self.entries = {}
+        self.requests = []
+
+    def get(self, url):
+        self.requests.append(("GET", url))
+        response = requests.Response()
+        response.url = url
+        if url in self.entries:
+            response.status_code = 200
+            response._content = self.entries[url]
+        else:
+            response.status_code = 404
+            response._content = b""
+        return response
+
+    def put(self, url, **kwargs):
+        self.requests.append(("PUT", url))
+        self.entries[url] = json.dumps(kwargs["json"]).encode()
+
+
+def test_remote_cache():
+    server = FakeCacheServer()
+    cache = RemoteCache("https://cache.example.com/", "test", server)
+    assert cache.get("foo") is None
+
+    cache.set("foo", {"bar": [1, 2]})
+    assert cache.get("foo") == {"bar": [1, 2]}
+    assert all(
+        url.startswith("https://cache.example.com/test/") for _, url in server.requests
+    )
+
+    # Entries of colliding or corrupt URLs are ignored
+    for url in server.entries:
+        server.entries[url] = b"{"
+    assert cache.get("foo") is None
+
+
+def test_remote_cache_is_disabled_once_unreachable():
+    session = mock.Mock()
+    session.get.side_effect = requests.ConnectionError
+    cache = RemoteCache("https://cache.example.com", "test", session)
+
+    assert cache.get("foo") is None
+    assert cache.get("bar") is None
+    cache.set("foo", "bar")
+
+    session.get.assert_called_once()
+    session.put.assert_not_called()
+
+
+def test_remote_dependency_cache(from_line, tmpdir):
+    server = FakeCacheServer()
+    cache = RemoteDependencyCache(
+        DependencyCache(tmpdir / "a"), "https://cache.example.com", server
+    )
+    cache[from_line("top[xtra]==1.2")] = ["middle>=0.3"]
+
+    other_cache = RemoteDependencyCache(
+        SQLiteDependencyCache(tmpdir / "b"), "https://cache.example.com", server
+    )
+    assert from_line("top==1.2") not in other_cache
+    assert other_cache[from_line("top[xtra]==1.2")] == ["middle>=0.3"]
+    assert other_cache.local[from_line("top[xtra]==1.2")] == ["middle>=0.3"]
@@ -8,7 +8,9 @@ from unittest import mock
 import pytest
 from pip._internal.utils.urls import path_to_url
 
-from piptools.scripts.compile import cli
+from piptools.fingerprint import compute_fingerprint
+from piptools.repositories import PyPIRepository
+from piptools.scripts.compile import DEPENDENCY_CACHE_BACKENDS, cli
 
 from .constants import MINIMAL_WHEELS_PATH, PACKAGES_PATH
 
@@ -450,7 +452,8 @@ def test_locally_available_editable_package_is_not_archived_in_cache_dir(
     assert "small-fake-a==0.1" in out.stderr
 
     # we should not find any archived file in {cache_dir}/pkgs
-    assert not os.listdir(os.path.join(str(cache_dir), "pkgs"))
+    pkgs_dir = os.path.join(str(cache_dir), "pkgs")
+    assert not os.path.exists(pkgs_dir) or not os.listdir(pkgs_dir)
 
 
 @pytest.mark.parametrize(
@@ -1534,3 +1537,475 @@ def test_duplicate_reqs_combined(
     assert out.exit_code == 0, out
     assert str(test_package_2) in out.stderr
     assert "test-package-1==0.1" in out.stderr
+
+
+def test_jobs_option(pip_conf, runner):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-with-deps\nsmall-fake-b")
+
+    out = runner.invoke(
+        cli,
+        [
+            "--no-annotate",
+            "--no-header",
+            "--no-emit-find-links",
+            "--jobs",
+            "2",
+            "--cache-dir",
+            "cache",
+        ],
+    )
+
+    assert out.exit_code == 0, out
+    assert out.stderr == dedent(
+        """\
+        small-fake-a==0.1
+        small-fake-b==0.3
+        small-fake-with-deps==0.1
+        """
+    )
+
+
+def test_jobs_option_with_options_in_requirements_file(runner):
+    with open("requirements.in", "w") as req_in:
+        req_in.write(
+            f"--find-links {MINIMAL_WHEELS_PATH}\nsmall-fake-with-deps\nsmall-fake-b"
+        )
+
+    out = runner.invoke(
+        cli,
+        [
+            "--no-annotate",
+            "--no-header",
+            "--no-emit-find-links",
+            "--pip-args=--no-index",
+            "--jobs",
+            "2",
+            "--cache-dir",
+            "cache",
+        ],
+    )
+
+    assert out.exit_code == 0, out
+    assert out.stderr == dedent(
+        """\
+        small-fake-a==0.1
+        small-fake-b==0.3
+        small-fake-with-deps==0.1
+        """
+    )
+
+
+def test_worklist_resolver_option(pip_conf, runner):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-with-deps\nsmall-fake-b")
+
+    out = runner.invoke(
+        cli, ["--no-header", "--no-emit-find-links", "--resolver", "worklist"]
+    )
+
+    assert out.exit_code == 0, out
+    assert out.stderr == dedent(
+        """\
+        small-fake-a==0.1
+            # via small-fake-with-deps
+        small-fake-b==0.3
+            # via -r requirements.in
+        small-fake-with-deps==0.1
+            # via -r requirements.in
+        """
+    )
+
+
+@pytest.mark.parametrize(
+    ("cache_backend", "extension"), (("sqlite", ".sqlite3"), ("binary", ".bin"))
+)
+def test_cache_backend_option(pip_conf, runner, tmpdir, cache_backend, extension):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-with-deps")
+
+    out = runner.invoke(
+        cli,
+        [
+            "--no-header",
+            "--no-emit-find-links",
+            "--cache-dir",
+            str(tmpdir),
+            "--cache-backend",
+            cache_backend,
+        ],
+    )
+
+    assert out.exit_code == 0, out
+    assert "small-fake-a==0.1" in out.stderr
+    assert any(path.endswith(extension) for path in os.listdir(tmpdir))
+
+
+def test_cache_prune(pip_conf, runner, tmpdir):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-with-deps")
+    out = runner.invoke(cli, ["--cache-dir", str(tmpdir)])
+    assert out.exit_code == 0, out
+
+    out = runner.invoke(
+        cli, ["--cache-dir", str(tmpdir), "--cache-prune", "--cache-max-entries", "1"]
+    )
+
+    assert out.exit_code == 0, out
+    assert out.stderr == "Removed 1 entries from the dependency cache\n"
+
+
+def test_cache_prune_requires_bounds(runner, tmpdir):
+    out = runner.invoke(cli, ["--cache-dir", str(tmpdir), "--cache-prune"])
+
+    assert out.exit_code == 2
+    assert "--cache-prune requires --cache-max-entries or --cache-max-age" in (
+        out.stderr
+    )
+
+
+def test_existing_output_file_is_parsed_with_the_same_repository(pip_conf, runner):
+    """
+    Test the existing output file is read without creating another repository,
+    and that its options don't get into the repository.
+    """
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+    with open("requirements.txt", "w") as req_txt:
+        req_txt.write("--trusted-host outdated.example.com\nsmall-fake-a==0.1\n")
+
+    with mock.patch(
+        "piptools.scripts.compile.PyPIRepository", wraps=PyPIRepository
+    ) as repository_class:
+        out = runner.invoke(cli, ["--no-header", "--no-emit-find-links"])
+
+    assert out.exit_code == 0, out
+    assert repository_class.call_count == 1
+    assert "outdated.example.com" not in out.stderr
+    assert "small-fake-a==0.1" in out.stderr
+
+
+def test_skip_unchanged(pip_conf, runner, tmpdir):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+    args = ["--no-emit-find-links", "--cache-dir", str(tmpdir), "--skip-unchanged"]
+    out = runner.invoke(cli, args)
+    assert out.exit_code == 0, out
+
+    with mock.patch("piptools.scripts.compile.PyPIRepository") as repository_class:
+        out = runner.invoke(cli, args)
+
+    assert out.exit_code == 0, out
+    assert not repository_class.called
+    assert out.stderr == "requirements.txt is up to date, nothing updated.\n"
+
+
+@pytest.mark.parametrize(
+    ("file_name", "content"),
+    (
+        pytest.param(
+            "requirements.in", "small-fake-a\nsmall-fake-b\n-r nested.in", id="input"
+        ),
+        pytest.param("nested.in", "small-fake-b", id="nested input"),
+        pytest.param("requirements.txt", "small-fake-a==0.1\n", id="output"),
+    ),
+)
+def test_skip_unchanged_compiles_changed_files(
+    pip_conf, runner, tmpdir, file_name, content
+):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a\n-r nested.in")
+    with open("nested.in", "w") as nested_in:
+        nested_in.write("")
+    args = ["--no-emit-find-links", "--cache-dir", str(tmpdir), "--skip-unchanged"]
+    out = runner.invoke(cli, args)
+    assert out.exit_code == 0, out
+
+    with open(file_name, "w") as changed_file:
+        changed_file.write(content)
+    out = runner.invoke(cli, args)
+
+    assert out.exit_code == 0, out
+    assert "small-fake-a==" in out.stderr
+    assert "is up to date" not in out.stderr
+
+
+@pytest.mark.parametrize(
+    "extra_args",
+    (
+        pytest.param(["--upgrade"], id="upgrade"),
+        pytest.param(["--upgrade-package", "small-fake-a"], id="upgrade-package"),
+        pytest.param(["--index-url", "https://example.com"], id="changed option"),
+    ),
+)
+def test_skip_unchanged_compiles_with_other_options(
+    pip_conf, runner, tmpdir, extra_args
+):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+    args = ["--no-emit-find-links", "--cache-dir", str(tmpdir), "--skip-unchanged"]
+    out = runner.invoke(cli, args)
+    assert out.exit_code == 0, out
+
+    with mock.patch(
+        "piptools.scripts.compile.PyPIRepository", wraps=PyPIRepository
+    ) as repository_class:
+        out = runner.invoke(cli, args + extra_args)
+
+    assert out.exit_code == 0, out
+    assert repository_class.called
+
+
+def test_skip_unchanged_compiles_with_changed_pip_conf(pip_conf, runner, tmpdir):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+    args = ["--no-emit-find-links", "--cache-dir", str(tmpdir), "--skip-unchanged"]
+    out = runner.invoke(cli, args)
+    assert out.exit_code == 0, out
+
+    with open(pip_conf, "a") as conf:
+        conf.write("pre = true\n")
+    out = runner.invoke(cli, args)
+
+    assert out.exit_code == 0, out
+    assert "small-fake-a==" in out.stderr
+    assert "is up to date" not in out.stderr
+
+
+@pytest.mark.parametrize(
+    ("line", "fingerprintable"),
+    (
+        pytest.param("small-fake-a==0.1", True, id="pinned"),
+        pytest.param(
+            "-e git+https://example.com/repo.git@" + "a" * 40 + "#egg=fake",
+            False,
+            id="editable",
+        ),
+        pytest.param(
+            "git+https://example.com/repo.git#egg=fake", False, id="vcs default branch"
+        ),
+        pytest.param(
+            "fake @ git+ssh://git@example.com/repo.git@main", False, id="vcs branch"
+        ),
+        pytest.param(
+            "fake @ git+ssh://git@example.com/repo.git@" + "a" * 40,
+            True,
+            id="vcs commit",
+        ),
+    ),
+)
+def test_skip_unchanged_fingerprint_of_vcs_and_editable_requirements(
+    runner, line, fingerprintable
+):
+    with open("requirements.in", "w") as req_in:
+        req_in.write(line)
+    with open("requirements.txt", "w") as req_txt:
+        req_txt.write("")
+    ctx = cli.make_context("pip-compile", ["--skip-unchanged"])
+
+    fingerprint = compute_fingerprint(ctx, ("requirements.in",), "requirements.txt")
+
+    assert (fingerprint is not None) is fingerprintable
+
+
+@pytest.mark.parametrize(
+    "patched",
+    (
+        pytest.param(("pip.__version__", "99.0"), id="pip"),
+        pytest.param(
+            ("piptools.fingerprint._get_piptools_version", lambda: "99.0"),
+            id="pip-tools",
+        ),
+    ),
+)
+def test_skip_unchanged_fingerprint_of_versions(runner, monkeypatch, patched):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+    with open("requirements.txt", "w") as req_txt:
+        req_txt.write("")
+    ctx = cli.make_context("pip-compile", ["--skip-unchanged"])
+    fingerprint = compute_fingerprint(ctx, ("requirements.in",), "requirements.txt")
+
+    monkeypatch.setattr(*patched)
+
+    assert (
+        compute_fingerprint(ctx, ("requirements.in",), "requirements.txt")
+        != fingerprint
+    )
+
+
+def test_batch(pip_conf, runner, tmpdir):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+    with open("dev.in", "w") as req_in:
+        req_in.write("small-fake-b")
+    with open("batch.txt", "w") as batch_file:
+        batch_file.write(
+            "# The lock files of the project\n"
+            "pip-compile\n"
+            "\n"
+            "dev.in --output-file dev-requirements.txt  # development\n"
+        )
+
+    with mock.patch(
+        "piptools.scripts.compile.PyPIRepository", wraps=PyPIRepository
+    ) as repository_class:
+        out = runner.invoke(
+            cli,
+            [
+                "--batch",
+                "batch.txt",
+                "--cache-dir",
+                str(tmpdir),
+                "--no-header",
+                "--no-emit-find-links",
+            ],
+        )
+
+    assert out.exit_code == 0, out
+    # Each compilation has its own repository, sharing the fetched documents
+    first_call, second_call = repository_class.call_args_list
+    assert first_call[1]["memos"] is second_call[1]["memos"]
+    with open("requirements.txt") as req_txt:
+        assert req_txt.read().startswith("small-fake-a==0.2")
+    with open("dev-requirements.txt") as req_txt:
+        assert req_txt.read().startswith("small-fake-b==0.3")
+
+
+def test_batch_keeps_the_options_of_input_files_apart(pip_conf, runner, tmpdir):
+    with open("a.in", "w") as req_in:
+        req_in.write(
+            "--extra-index-url https://private.example.com/simple\n"
+            "--trusted-host private.example.com\n"
+            "small-fake-a\n"
+        )
+    with open("b.in", "w") as req_in:
+        req_in.write("small-fake-b\n")
+    with open("batch.txt", "w") as batch_file:
+        batch_file.write("a.in\nb.in\n")
+
+    out = runner.invoke(
+        cli,
+        [
+            "--batch",
+            "batch.txt",
+            "--cache-dir",
+            str(tmpdir),
+            "--no-header",
+            "--no-emit-find-links",
+        ],
+    )
+
+    assert out.exit_code == 0, out
+    with open("a.txt") as req_txt:
+        assert "private.example.com" in req_txt.read()
+    with open("b.txt") as req_txt:
+        assert req_txt.read() == "small-fake-b==0.3\n    # via -r b.in\n"
+
+
+def test_batch_jobs(pip_conf, runner, tmpdir):
+    with open("batch.txt", "w") as batch_file:
+        for name in ("small-fake-a", "small-fake-b", "small-fake-with-deps"):
+            with open(f"{name}.in", "w") as req_in:
+                req_in.write(name)
+            batch_file.write(f"{name}.in\n")
+
+    out = runner.invoke(
+        cli,
+        [
+            "--batch",
+            "batch.txt",
+            "--batch-jobs",
+            "2",
+            "--cache-dir",
+            str(tmpdir),
+            "--cache-backend",
+            "sqlite",
+        ],
+    )
+
+    assert out.exit_code == 0, out
+    for name in ("small-fake-a", "small-fake-b", "small-fake-with-deps"):
+        with open(f"{name}.txt") as req_txt:
+            assert f"{name}==" in req_txt.read()
+
+
+def test_batch_failed_compilation(pip_conf, runner, tmpdir):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+    with open("unknown.in", "w") as req_in:
+        req_in.write("unknown-package")
+    with open("batch.txt", "w") as batch_file:
+        batch_file.write("unknown.in\nrequirements.in\n")
+
+    out = runner.invoke(cli, ["--batch", "batch.txt", "--cache-dir", str(tmpdir)])
+
+    assert out.exit_code == 2, out
+    assert "Failed to compile: pip-compile unknown.in" in out.stderr
+    assert os.path.exists("requirements.txt")
+    assert not os.path.exists("unknown.txt")
+
+
+def test_batch_with_input_files(runner):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+    with open("batch.txt", "w") as batch_file:
+        batch_file.write("requirements.in\n")
+
+    out = runner.invoke(cli, ["--batch", "batch.txt", "requirements.in"])
+
+    assert out.exit_code == 2
+    assert "--batch can't be combined with input files or --output-file" in out.stderr
+
+
+def test_serve_with_input_files(runner):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+
+    out = runner.invoke(cli, ["--serve", "pip-compile.sock", "requirements.in"])
+
+    assert out.exit_code == 2
+    assert "--serve can't be combined with input files or --output-file" in out.stderr
+
+
+@pytest.mark.parametrize("option", ("--batch", "--serve"))
+def test_batch_entry_with_batch_or_serve(runner, tmpdir, option):
+    open("nested.txt", "w").close()
+    with open("batch.txt", "w") as batch_file:
+        batch_file.write(f"{option} nested.txt\n")
+
+    out = runner.invoke(cli, ["--batch", "batch.txt", "--cache-dir", str(tmpdir)])
+
+    assert out.exit_code == 2, out
+    assert "--batch and --serve can't be used in a batch" in out.stderr
+
+
+@pytest.mark.parametrize(
+    ("options", "cache_backend", "expected_cache_count"),
+    (
+        pytest.param([], "sqlite", 1, id="default backend"),
+        pytest.param(["--cache-backend", "json"], "json", 2, id="json backend"),
+    ),
+)
+def test_serve_reads_file_caches_for_each_request(
+    pip_conf, runner, tmpdir, options, cache_backend, expected_cache_count
+):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+    cache_class = mock.Mock(wraps=DEPENDENCY_CACHE_BACKENDS[cache_backend])
+
+    def serve_requests(socket_path, handle_request):
+        for _ in range(2):
+            assert handle_request(["--no-emit-find-links"]) == 0
+
+    with mock.patch.dict(DEPENDENCY_CACHE_BACKENDS, {cache_backend: cache_class}):
+        with mock.patch(
+            "piptools.scripts.compile.serve_requests", side_effect=serve_requests
+        ):
+            out = runner.invoke(
+                cli,
+                ["--serve", "pip-compile.sock", "--cache-dir", str(tmpdir), *options],
+            )
+
+    assert out.exit_code == 0, out
+    assert cache_class.call_count == expected_cache_count
@@ -0,0 +1,197 @@
+import io
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from piptools.daemon import _reads_stdin, _receive, _send, client, serve
+
+
+def _wait_for_socket(path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            pytest.fail(f"Nothing is listening on {path}")
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def fake_daemon(tmpdir):
+    """
+    Serves the requests on a socket with a handler recording them, printing
+    to the standard output and error and returning 3.
+    """
+    socket_path = os.path.join(str(tmpdir), "daemon.sock")
+    requests = []
+
+    def handle_request(args):
+        requests.append((args, os.getcwd(), os.environ.get("PIP_FAKE_OPTION")))
+        if "-" in args:
+            print("read", sys.stdin.read())
+        print("compiled", *args)
+        print("warning", file=sys.stderr)
+        return 3
+
+    thread = threading.Thread(
+        target=serve, args=(socket_path, handle_request), daemon=True
+    )
+    thread.start()
+    _wait_for_socket(socket_path)
+    return socket_path, requests
+
+
+def test_client_streams_the_daemon_output(fake_daemon, capsys):
+    socket_path, requests = fake_daemon
+
+    exit_code = client([socket_path, "--dry-run", "requirements.in"])
+
+    assert exit_code == 3
+    assert requests == [(["--dry-run", "requirements.in"], os.getcwd(), None)]
+    captured = capsys.readouterr()
+    assert captured.out == "compiled --dry-run requirements.in\n"
+    assert captured.err == "warning\n"
+
+
+def _request(socket_path, request):
+    """Sends the request to the daemon, returning the output of each stream."""
+    output = {"stdout": "", "stderr": ""}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        _send(sock, request)
+        for message in _receive(sock):
+            if "stream" in message:
+                output[message["stream"]] += message["data"]
+    return output
+
+
+def test_daemon_reads_the_client_standard_input(fake_daemon, monkeypatch):
+    socket_path, _ = fake_daemon
+    monkeypatch.setattr(sys, "stdin", io.StringIO("daemon input"))
+
+    output = _request(
+        socket_path,
+        {"args": ["-"], "cwd": os.getcwd(), "environ": {}, "stdin": "client input"},
+    )
+
+    assert output["stdout"] == "read client input\ncompiled -\n"
+
+
+@pytest.mark.parametrize(
+    ("args", "expected"),
+    (
+        pytest.param(["-"], True, id="input file"),
+        pytest.param(["a.in", "-o", "-"], False, id="output file"),
+        pytest.param(["--output-file", "-", "-"], True, id="both"),
+        pytest.param(["a.in"], False, id="no stdin"),
+    ),
+)
+def test_reads_stdin(args, expected):
+    assert _reads_stdin(args) is expected
+
+
+def test_daemon_streams_the_log_handlers(tmpdir):
+    socket_path = os.path.join(str(tmpdir), "daemon.sock")
+    stderr = sys.stderr
+    handler = logging.StreamHandler(stderr)
+    logger = logging.getLogger()
+    logger.addHandler(handler)
+
+    def handle_request(args):
+        logger.warning("logged")
+        return 0
+
+    thread = threading.Thread(
+        target=serve, args=(socket_path, handle_request), daemon=True
+    )
+    thread.start()
+    _wait_for_socket(socket_path)
+    try:
+        output = _request(socket_path, {"args": [], "cwd": os.getcwd(), "environ": {}})
+    finally:
+        logger.removeHandler(handler)
+
+    assert "logged" in output["stderr"].splitlines()
+    assert handler.stream is stderr
+
+
+def test_daemon_applies_the_client_environment(fake_daemon, tmpdir):
+    socket_path, requests = fake_daemon
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        _send(
+            sock,
+            {"args": [], "cwd": str(tmpdir), "environ": {"PIP_FAKE_OPTION": "1"}},
+        )
+        messages = list(_receive(sock))
+
+    assert messages[-1] == {"exit": 3}
+    assert requests == [([], str(tmpdir), "1")]
+    assert "PIP_FAKE_OPTION" not in os.environ
+
+
+def test_daemon_refuses_a_socket_in_use(fake_daemon):
+    socket_path, _ = fake_daemon
+
+    with pytest.raises(OSError, match="A daemon is already listening"):
+        serve(socket_path, lambda args: 0)
+
+
+def test_client_compiles_in_process_without_daemon(pip_conf, runner, tmpdir):
+    with open("requirements.in", "w") as req_in:
+        req_in.write("small-fake-a")
+
+    exit_code = client(
+        [
+            os.path.join(str(tmpdir), "missing.sock"),
+            "--cache-dir",
+            str(tmpdir),
+            "--no-header",
+            "--no-emit-find-links",
+        ]
+    )
+
+    assert exit_code == 0
+    with open("requirements.txt") as req_txt:
+        assert req_txt.read().startswith("small-fake-a==0.2")
+
+
+def test_pip_compile_serve(pip_conf, tmpdir, capfd):
+    socket_path = os.path.join(str(tmpdir), "pip-compile.sock")
+    req_in_path = os.path.join(str(tmpdir), "requirements.in")
+    with open(req_in_path, "w") as req_in:
+        req_in.write("small-fake-with-deps")
+    daemon = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "piptools",
+            "compile",
+            "--serve",
+            socket_path,
+            "--cache-dir",
+            str(tmpdir),
+            "--no-header",
+        ]
+    )
+    try:
+        _wait_for_socket(socket_path)
+
+        assert client([socket_path, "--no-emit-find-links", req_in_path]) == 0
+        with open(os.path.join(str(tmpdir), "requirements.txt")) as req_txt:
+            assert req_txt.read().startswith("small-fake-a==0.1")
+
+        assert client([socket_path, "missing.in"]) == 2
+        assert "Path 'missing.in' does not exist" in capfd.readouterr().err
+    finally:
+        daemon.send_signal(signal.SIGINT)
+        daemon.wait(timeout=30)
+
+    assert daemon.returncode == 0
+    assert not os.path.exists(socket_path)
@@ -1,4 +1,5 @@
 import copy
+from unittest import mock
 
 import pytest
 
@@ -88,3 +89,41 @@ def test_local_repository_copy_ireq_dependencies(from_line):
     local_repository.copy_ireq_dependencies(src, dest)
 
     assert src in checker.copied
+
+
+def test_local_repository_prefetch_candidates_skips_existing_pins(from_line):
+    existing_pins = {"small-fake-a": from_line("small-fake-a==0.1")}
+    repository = FakeRepository()
+    local_repository = LocalRequirementsRepository(existing_pins, repository)
+
+    with mock.patch.object(repository, "prefetch_candidates") as prefetch_candidates:
+        local_repository.prefetch_candidates(
+            [
+                from_line("small-fake-a"),
+                from_line("small-fake-a>0.1"),
+                from_line("small-fake-b"),
+            ]
+        )
+
+    ((fetched_ireqs,), _) = prefetch_candidates.call_args
+    assert [str(ireq.req) for ireq in fetched_ireqs] == [
+        "small-fake-a>0.1",
+        "small-fake-b",
+    ]
+
+
+def test_get_all_hashes_local_repository_reuses_existing_pins(from_line, repository):
+    options = {"hashes": {"sha256": [entry.split(":")[1] for entry in NONSENSE]}}
+    existing_pins = {"small-fake-a": from_line("small-fake-a==0.1", options=options)}
+    local_repository = LocalRequirementsRepository(existing_pins, repository)
+    ireqs = [from_line("small-fake-a==0.1"), from_line("small-fake-b==0.1")]
+
+    with mock.patch.object(
+        repository, "get_all_hashes", return_value={ireqs[1]: EXPECTED}
+    ) as get_all_hashes:
+        assert local_repository.get_all_hashes(ireqs) == {
+            ireqs[0]: NONSENSE,
+            ireqs[1]: EXPECTED,
+        }
+
+    get_all_hashes.assert_called_once_with([ireqs[1]])
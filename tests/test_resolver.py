@@ -1,8 +1,12 @@
+import os
+from unittest import mock
+
 import pytest
 
 from piptools._compat import PIP_VERSION
 from piptools.exceptions import NoCandidateFound
 from piptools.resolver import RequirementSummary, combine_install_requirements
+from piptools.utils import key_from_ireq
 
 
 @pytest.mark.parametrize(
@@ -193,9 +197,17 @@ from piptools.resolver import RequirementSummary, combine_install_requirements
         ]
     ),
 )
+@pytest.mark.parametrize("resolver_fixture", ("resolver", "worklist_resolver"))
 def test_resolver(
-    resolver, from_line, input, expected, prereleases, unsafe_constraints
+    request,
+    resolver_fixture,
+    from_line,
+    input,
+    expected,
+    prereleases,
+    unsafe_constraints,
 ):
+    resolver = request.getfixturevalue(resolver_fixture)
     input = [line if isinstance(line, tuple) else (line, False) for line in input]
     input = [from_line(req[0], constraint=req[1]) for req in input]
     resolver = resolver(input, prereleases=prereleases)
@@ -239,9 +251,11 @@ def test_resolver(
         ]
     ),
 )
+@pytest.mark.parametrize("resolver_fixture", ("resolver", "worklist_resolver"))
 def test_resolver__allows_unsafe_deps(
-    resolver, from_line, input, expected, prereleases
+    request, resolver_fixture, from_line, input, expected, prereleases
 ):
+    resolver = request.getfixturevalue(resolver_fixture)
     input = [line if isinstance(line, tuple) else (line, False) for line in input]
     input = [from_line(req[0], constraint=req[1]) for req in input]
     output = resolver(input, prereleases=prereleases, allow_unsafe=True).resolve()
@@ -258,6 +272,66 @@ def test_resolver__max_number_rounds_reached(resolver, from_line):
         resolver(input).resolve(max_rounds=0)
 
 
+def test_worklist_resolver__max_number_updates_reached(worklist_resolver, from_line):
+    """
+    WorklistResolver should raise an exception if a package has been updated
+    more than max rounds times.
+    """
+    input = [from_line("django")]
+    with pytest.raises(RuntimeError, match="after 0 updates of django"):
+        worklist_resolver(input).resolve(max_rounds=0)
+
+
+@pytest.mark.parametrize(
+    "constraints",
+    (
+        ["Flask"],
+        ["Django", "Flask"],
+        ["celery<=3.1.23", "librabbitmq"],
+        ["billiard", "celery", "fake-piptools-test-with-pinned-deps"],
+    ),
+)
+def test_worklist_resolver_looks_up_less(
+    resolver, worklist_resolver, from_line, constraints
+):
+    """
+    The worklist resolver ends up with the same results and annotations as
+    the resolver, with fewer best match lookups.
+    """
+    rounds_resolver = resolver(map(from_line, constraints))
+    expected = rounds_resolver.resolve()
+    worklist_resolver = worklist_resolver(map(from_line, constraints))
+    results = worklist_resolver.resolve()
+
+    assert sorted(map(str, results)) == sorted(map(str, expected))
+    assert {
+        str(ireq): sorted(map(str, getattr(ireq, "_source_ireqs", [])))
+        for ireq in results
+    } == {
+        str(ireq): sorted(map(str, getattr(ireq, "_source_ireqs", [])))
+        for ireq in expected
+    }
+    assert worklist_resolver.best_match_lookups < rounds_resolver.best_match_lookups
+
+
+def test_worklist_resolver_drops_orphans(worklist_resolver, from_line, repository):
+    """
+    Packages only required by each other are dropped once nothing else
+    requires them.
+    """
+    repository.index["fake-a"] = {"1.0": {"": ["fake-b"]}, "2.0": {"": []}}
+    repository.index["fake-b"] = {"1.0": {"": ["fake-c"]}}
+    repository.index["fake-c"] = {"1.0": {"": ["fake-b"]}}
+    repository.index["fake-d"] = {"1.0": {"": []}, "2.0": {"": ["fake-a<2"]}}
+    repository.index["fake-e"] = {"1.0": {"": ["fake-d<2"]}}
+
+    results = worklist_resolver(
+        [from_line("fake-a"), from_line("fake-d"), from_line("fake-e")]
+    ).resolve()
+
+    assert sorted(map(str, results)) == ["fake-a==2.0", "fake-d==1.0", "fake-e==1.0"]
+
+
 def test_iter_dependencies(resolver, from_line):
     """
     Dependencies should be pinned or editable.
@@ -300,6 +374,23 @@ def test_combine_install_requirements(repository, from_line):
     assert str(combined_all.req.specifier) == "<3.2,==3.1.1,>3.0"
 
 
+def test_combine_install_requirements_leaves_sources_untouched(repository, from_line):
+    ipython = from_line("ipython[notebook]>=2.0")
+    ipython21 = from_line("ipython[nbconvert]<2.1", constraint=True)
+
+    with mock.patch("copy.deepcopy") as deepcopy:
+        combined = combine_install_requirements(repository, [ipython, ipython21])
+
+    deepcopy.assert_not_called()
+    assert str(combined.req.specifier) == "<2.1,>=2.0"
+    assert combined.extras == ("nbconvert", "notebook")
+    assert not combined.constraint
+    assert str(ipython.req.specifier) == ">=2.0"
+    assert ipython.extras == {"notebook"}
+    assert str(ipython21.req.specifier) == "<2.1"
+    assert ipython21.constraint
+
+
 def test_compile_failure_shows_provenance(resolver, from_line):
     """
     Provenance of conflicting dependencies should be printed on failure.
@@ -441,3 +532,49 @@ def test_RequirementSummary_hash_equality(from_line, left_hand, right_hand, expe
     lh_summary = RequirementSummary(from_line(left_hand))
     rh_summary = RequirementSummary(from_line(right_hand))
     assert (hash(lh_summary) == hash(rh_summary)) is expected
+
+
+def test_resolver_flushes_dependency_cache(resolver, from_line, depcache):
+    depcache.flush_threshold = 1000
+    resolver([from_line("Flask")]).resolve()
+
+    assert os.path.exists(depcache._cache_file)
+    assert not depcache._unsaved_entries
+
+
+@pytest.mark.parametrize(
+    ("previous_constraints", "constraints", "expected_rounds"),
+    (
+        pytest.param(["Flask"], ["Flask"], 1, id="unchanged constraints"),
+        pytest.param(["Django"], ["Django", "Flask"], 3, id="added constraint"),
+        pytest.param(
+            ["Flask", "celery==3.1.18"], ["Flask"], 1, id="removed constraint"
+        ),
+        pytest.param(
+            ["celery==3.1.18"], ["celery==3.1.23"], 3, id="changed constraint"
+        ),
+    ),
+)
+def test_resolver_starts_from_existing_pins(
+    resolver, from_line, previous_constraints, constraints, expected_rounds
+):
+    """
+    The resolver starts from the cached dependencies of existing pins, and
+    ends up with the same results as without them.
+    """
+    previous_results = resolver(map(from_line, previous_constraints)).resolve()
+    existing_pins = {key_from_ireq(ireq): ireq for ireq in previous_results}
+    expected = resolver(map(from_line, constraints)).resolve()
+
+    incremental_resolver = resolver(
+        map(from_line, constraints), existing_pins=existing_pins
+    )
+    with mock.patch.object(
+        incremental_resolver,
+        "_resolve_one_round",
+        wraps=incremental_resolver._resolve_one_round,
+    ) as resolve_one_round:
+        results = incremental_resolver.resolve()
+
+    assert resolve_one_round.call_count == expected_rounds
+    assert sorted(map(str, results)) == sorted(map(str, expected))
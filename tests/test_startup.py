@@ -0,0 +1,51 @@
+import platform
+import subprocess
+import sys
+
+import pytest
+
+# Importing any of these pulls in pkg_resources, distutils and the network
+# stack, which the CLI only needs once it actually resolves or installs.
+HEAVY_MODULES = (
+    "pip._internal.index.package_finder",
+    "pip._internal.req",
+    "pip._internal.utils.misc",
+    "pip._vendor.pkg_resources",
+    "pip._vendor.requests",
+)
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 7) or platform.python_implementation() != "CPython",
+    reason="python -X importtime is available on CPython>=3.7",
+)
+
+
+def _import_times(module):
+    """
+    Return a mapping of module name to cumulative import time in microseconds,
+    as reported by ``python -X importtime``.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    "module", ("piptools.scripts.compile", "piptools.scripts.sync")
+)
+def test_cli_startup_does_not_import_heavy_pip_modules(module):
+    times = _import_times(module)
+
+    assert module in times
+    assert not [name for name in HEAVY_MODULES if name in times]
@@ -225,6 +225,18 @@ def test_name_from_req_with_project_name(from_line):
         (["--upgrade"], "pip-compile"),
         (["-P", "django"], "pip-compile"),
         (["--upgrade-package", "django"], "pip-compile"),
+        (["-j", "4"], "pip-compile"),
+        (["--jobs", "4"], "pip-compile"),
+        (["--resolver", "worklist"], "pip-compile"),
+        (["--max-index-age", "600"], "pip-compile"),
+        (["--skip-unchanged"], "pip-compile"),
+        (["--batch-jobs", "4"], "pip-compile"),
+        (["--serve", "pip-compile.sock"], "pip-compile"),
+        (["--cache-backend", "sqlite"], "pip-compile"),
+        (["--cache-backend", "binary"], "pip-compile"),
+        (["--cache-max-entries", "1000"], "pip-compile"),
+        (["--cache-max-age", "90"], "pip-compile"),
+        (["--remote-cache", "https://cache.example.com"], "pip-compile"),
         # Check options
         (["--max-rounds", "42"], "pip-compile --max-rounds=42"),
         (["--index-url", "https://foo"], "pip-compile --index-url=https://foo"),